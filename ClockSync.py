@@ -0,0 +1,176 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _segment_starts(breaks):
+    # Inclusive (start, stop) indices of the runs between True entries of a break mask over np.diff
+    break_indices = np.flatnonzero(breaks)
+    return np.concatenate([[0], break_indices + 1]), np.concatenate([break_indices, [len(breaks)]])
+
+
+def _glitches(diff, threshold_stds, threshold_seconds):
+    # Differences that stand out both in MAD units and in absolute terms
+    shifted = diff - np.median(diff)
+    mad = np.median(np.abs(shifted)) + np.finfo(float).eps
+    return (np.abs(shifted / mad) > threshold_stds) & (np.abs(shifted) > threshold_seconds)
+
+
+def clock_reset_ranges(clock_times, clock_values, reset_threshold_stds=5, reset_threshold_seconds=5,
+                       reset_threshold_offset_stds=10, reset_threshold_offset_seconds=1):
+    # Inclusive index ranges of clock offsets between clock resets, detected like pyxdf does
+    time_diff, value_diff = np.diff(clock_times), np.diff(clock_values)
+    resets = (time_diff < 0) | (_glitches(time_diff, reset_threshold_stds, reset_threshold_seconds)
+                                & _glitches(value_diff, reset_threshold_offset_stds, reset_threshold_offset_seconds))
+    return np.column_stack(_segment_starts(resets))
+
+
+def robust_line_fit(x, y, rho=1, iters=1000, tol=1e-13):
+    """
+    Intercept and slope minimizing the Huber loss of y - (intercept + slope * x), solved with ADMM like pyxdf's
+    _robust_fit. The least-squares projection is computed once, so every iteration is a few array operations,
+    and the iterations stop once the solution no longer changes.
+    """
+    offset = np.min(x)
+    design = np.column_stack([np.ones_like(x), x - offset])
+    projection = np.linalg.solve(design.T @ design, design.T)
+    z = np.zeros_like(y)
+    u = z
+    coef = np.zeros(2)
+    for _ in range(iters):
+        previous = coef
+        coef = projection @ (y + z - u)
+        d = design @ coef - y + u
+        d_inv = np.zeros_like(d)
+        np.divide(1, d, out=d_inv, where=d != 0)
+        shrink = np.maximum(0, 1 - (1 + 1 / rho) * np.abs(d_inv))
+        z = rho / (1 + rho) * d + 1 / (1 + rho) * shrink * d
+        u = d - z
+        if np.all(np.abs(coef - previous) <= tol * (1 + np.abs(coef))):
+            break
+    return coef[0] - coef[1] * offset, coef[1]
+
+
+def fit_clock_offsets(clock_times, clock_values, handle_clock_resets=True, winsor_threshold=0.0001):
+    """
+    Linear mappings from the stream's clock to the recorder's clock, one per range of clock offsets between
+    clock resets, as a list of {start, stop, intercept, slope} (start and stop index the clock offsets, inclusive).
+    """
+    clock_times, clock_values = np.asarray(clock_times, dtype=float), np.asarray(clock_values, dtype=float)
+    if len(clock_times) == 0:
+        return []
+    if handle_clock_resets and len(clock_times) > 1:
+        ranges = clock_reset_ranges(clock_times, clock_values)
+    else:
+        ranges = [(0, len(clock_times) - 1)]
+    fits = []
+    for start, stop in ranges:
+        if start == stop:
+            intercept, slope = clock_values[start], 0.0
+        else:
+            try:
+                # Scaled like pyxdf so the Huber threshold is winsor_threshold seconds
+                intercept, slope = robust_line_fit(clock_times[start:stop + 1] / winsor_threshold,
+                                                   clock_values[start:stop + 1] / winsor_threshold)
+                intercept *= winsor_threshold
+            except np.linalg.LinAlgError:
+                logger.warning('Clock offsets %d to %d cannot be used for synchronization', start, stop)
+                intercept, slope = 0.0, 0.0
+        fits.append(dict(start=int(start), stop=int(stop), intercept=float(intercept), slope=float(slope)))
+    return fits
+
+
+def synchronize(time_stamps, clock_times, fits):
+    # Time stamps mapped to the recorder's clock; each sample uses the range whose clock offsets are nearest
+    if not fits:
+        return np.array(time_stamps, dtype=float)
+    time_stamps = np.asarray(time_stamps, dtype=float)
+    clock_times = np.asarray(clock_times, dtype=float)
+    ends = clock_times[[fit['stop'] for fit in fits[:-1]]]
+    starts = clock_times[[fit['start'] for fit in fits[1:]]]
+    boundaries = np.maximum.accumulate(np.searchsorted(time_stamps, (ends + starts) / 2))
+    range_of_sample = np.searchsorted(boundaries, np.arange(len(time_stamps)), side='right')
+    intercepts = np.array([fit['intercept'] for fit in fits])[range_of_sample]
+    slopes = np.array([fit['slope'] for fit in fits])[range_of_sample]
+    return time_stamps + intercepts + slopes * time_stamps
+
+
+def dejitter(time_stamps, nominal_srate, threshold_seconds=1, threshold_samples=500):
+    """
+    Replaces the time stamps of a regularly sampled stream by a straight line per segment between gaps, as
+    pyxdf's jitter removal does, with all segments fitted at once. Returns (time_stamps, effective_srate).
+    """
+    time_stamps = np.asarray(time_stamps, dtype=float)
+    n = len(time_stamps)
+    if nominal_srate == 0 or n == 0:
+        return time_stamps.copy(), 0.0
+    breaks = np.abs(np.diff(time_stamps)) > max(threshold_seconds, threshold_samples / nominal_srate)
+    starts, stops = _segment_starts(breaks)
+    counts = stops - starts + 1
+    # Least squares against the sample index, centred per segment to keep the sums well conditioned
+    index = np.arange(n, dtype=float)
+    segment = np.repeat(np.arange(len(starts)), counts)
+    index_mean = (starts + stops) / 2
+    centred_index = index - index_mean[segment]
+    centred_stamps = time_stamps - time_stamps[starts][segment]
+    stamps_mean = np.add.reduceat(centred_stamps, starts) / counts
+    index_var = counts * (counts ** 2 - 1) / 12
+    covariance = np.add.reduceat(centred_index * centred_stamps, starts)
+    slope = np.divide(covariance, index_var, out=np.zeros(len(starts)), where=index_var > 0)
+    dejittered = time_stamps[starts][segment] + stamps_mean[segment] + slope[segment] * centred_index
+    multi = counts > 1
+    durations = dejittered[stops[multi]] - dejittered[starts[multi]]
+    effective_srate = np.sum(counts[multi] - 1) / np.sum(durations) if multi.any() else 0.0
+    return dejittered, float(effective_srate)
+
+
+class ClockSync:
+    """
+    Raw time stamps and clock offsets of one stream, and the timing variants derived from them.
+
+    The clock offset fit is computed once (or handed in, e.g. from the session cache) and every variant of
+    synchronized and/or dejittered time stamps is computed on first use and kept, so switching between them
+    never re-parses the XDF file.
+    """
+
+    def __init__(self, time_stamps, clock_times, clock_values, nominal_srate, fits=None):
+        self.raw_time_stamps = np.asarray(time_stamps)
+        self.clock_times = np.asarray(clock_times, dtype=float)
+        self.clock_values = np.asarray(clock_values, dtype=float)
+        self.nominal_srate = nominal_srate
+        self._fits = fits
+        self._variants = {}
+
+    @classmethod
+    def from_stream(cls, stream):
+        # From a pyxdf stream dict loaded with synchronize_clocks=False and dejitter_timestamps=False
+        return cls(stream['time_stamps'], stream.get('clock_times', []), stream.get('clock_values', []),
+                   float(stream['info']['nominal_srate'][0]), stream.get('clock_fits'))
+
+    @property
+    def fits(self):
+        if self._fits is None:
+            self._fits = fit_clock_offsets(self.clock_times, self.clock_values)
+        return self._fits
+
+    def _variant(self, synchronize_clocks, dejitter_timestamps):
+        key = (synchronize_clocks, dejitter_timestamps)
+        if key not in self._variants:
+            time_stamps = self.raw_time_stamps
+            if synchronize_clocks:
+                time_stamps = synchronize(time_stamps, self.clock_times, self.fits)
+            if dejitter_timestamps:
+                time_stamps, effective_srate = dejitter(time_stamps, self.nominal_srate)
+            else:
+                duration = time_stamps[-1] - time_stamps[0] if len(time_stamps) > 1 else 0
+                effective_srate = (len(time_stamps) - 1) / duration if self.nominal_srate and duration else 0.0
+            self._variants[key] = (time_stamps, effective_srate)
+        return self._variants[key]
+
+    def time_stamps(self, synchronize_clocks=True, dejitter_timestamps=True):
+        return self._variant(synchronize_clocks, dejitter_timestamps)[0]
+
+    def effective_srate(self, synchronize_clocks=True, dejitter_timestamps=True):
+        return self._variant(synchronize_clocks, dejitter_timestamps)[1]
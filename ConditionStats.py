@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def _blocks(total, size):
+    # At least one item per block, however small the budget the size was derived from
+    size = max(1, size)
+    for start in range(0, total, size):
+        yield slice(start, min(start + size, total))
+
+
+def bootstrap_mean_ci(data, confidence_interval=0.95, n_bootstrap=10000, seed=None, max_bytes=64 * 1024 ** 2):
+    """
+    Percentile bootstrap confidence interval of the mean over the first axis of `data` (n_trials, ...).
+
+    Each batch of resamples is drawn as a matrix of per-trial counts, so its means are a single matrix product
+    with the trials instead of one fancy-indexed copy per resample. Features are processed in blocks and
+    resamples in batches so neither the count matrix nor the bootstrap means exceed `max_bytes`.
+    Returns (lower, upper), each shaped like data[0].
+    """
+    data = np.asarray(data, dtype=np.float64)
+    n_trials = len(data)
+    flat = data.reshape(n_trials, -1)
+    alpha = (1 - confidence_interval) / 2
+    lower = np.empty(flat.shape[1])
+    upper = np.empty(flat.shape[1])
+    feature_block = max_bytes // (8 * n_bootstrap)
+    resample_batch = max_bytes // (8 * n_trials)
+    for features in _blocks(flat.shape[1], feature_block):
+        # Same seed for every feature block, so all features see the same resamples
+        rng = np.random.default_rng(seed)
+        means = np.empty((n_bootstrap, features.stop - features.start))
+        for resamples in _blocks(n_bootstrap, resample_batch):
+            counts = rng.multinomial(n_trials, np.full(n_trials, 1 / n_trials), size=resamples.stop - resamples.start)
+            means[resamples] = counts @ flat[:, features] / n_trials
+        lower[features], upper[features] = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    return lower.reshape(data.shape[1:]), upper.reshape(data.shape[1:])
+
+
+def parametric_mean_ci(data, confidence_interval=0.95):
+    # Student-t interval of the mean over the first axis
+    from scipy import stats
+    data = np.asarray(data, dtype=np.float64)
+    mean = data.mean(axis=0)
+    sem = data.std(axis=0, ddof=1) / np.sqrt(len(data))
+    half_width = stats.t.ppf((1 + confidence_interval) / 2, len(data) - 1) * sem
+    return mean - half_width, mean + half_width
+
+
+def condition_statistics(data, confidence_interval=0.95, method='bootstrap', **kwargs):
+    # {'mean', 'lower', 'upper', 'n_trials'} for one condition's trials
+    data = np.asarray(data, dtype=np.float64)
+    if method == 'bootstrap':
+        lower, upper = bootstrap_mean_ci(data, confidence_interval, **kwargs)
+    elif method == 'parametric':
+        lower, upper = parametric_mean_ci(data, confidence_interval)
+    else:
+        raise ValueError(f'Unknown confidence interval method {method!r}, use "bootstrap" or "parametric"')
+    return dict(mean=data.mean(axis=0), lower=lower, upper=upper, n_trials=len(data))
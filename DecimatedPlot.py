@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def minmax_decimate(x, y, n_bins):
+    """
+    Keeps the minimum and maximum sample of each of `n_bins` equal-count bins, in time order.
+    The drawn envelope looks the same as plotting every sample, with at most 2 * n_bins points.
+    """
+    n = len(y)
+    if n <= 2 * n_bins:
+        return x, y
+    bin_size = -(-n // n_bins)
+    n_bins = -(-n // bin_size)
+    bins = np.pad(y, (0, n_bins * bin_size - n), mode='edge').reshape(n_bins, bin_size)
+    offsets = np.arange(n_bins) * bin_size
+    indices = np.sort(np.stack([offsets + bins.argmin(axis=1), offsets + bins.argmax(axis=1)], axis=1), axis=1)
+    indices = np.minimum(indices.ravel(), n - 1)
+    return x[indices], y[indices]
+
+
+class DecimatedLine:
+    """
+    Line that only draws a min/max decimation of the samples inside the visible x range.
+
+    The decimation is redone whenever the x limits change (zoom, pan), with about two points per pixel column, so
+    the number of drawn points stays constant whatever the recording length. `x` must be sorted.
+    """
+
+    def __init__(self, ax, x, y, points_per_pixel=2, **line_kwargs):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.points_per_pixel = points_per_pixel
+        self.line, = ax.plot([], [], **line_kwargs)
+        ax.set_xlim(self.x[0], self.x[-1])
+        margin = 0.05 * (np.max(self.y) - np.min(self.y))
+        ax.set_ylim(np.min(self.y) - margin, np.max(self.y) + margin)
+        self._update(ax)
+        # A lambda keeps this object alive, matplotlib only holds weak references to bound methods
+        ax.callbacks.connect('xlim_changed', lambda changed_ax: self._update(changed_ax))
+
+    def _update(self, ax):
+        x_min, x_max = ax.get_xlim()
+        start = max(np.searchsorted(self.x, x_min) - 1, 0)
+        stop = np.searchsorted(self.x, x_max) + 1
+        n_bins = max(1, int(ax.bbox.width * self.points_per_pixel / 2))
+        self.line.set_data(*minmax_decimate(self.x[start:stop], self.y[start:stop], n_bins))
+
+
+class MarkerOverlay:
+    """
+    Marker lines drawn as a single LineCollection, with labels only when few enough markers are visible.
+    Labels are rebuilt on every change of the x limits.
+    """
+
+    def __init__(self, ax, x_values, y_coord, labels, max_labels=50, color='r'):
+        self.x = np.asarray(x_values)
+        self.labels = [str(label) for label in labels]
+        self.y_coord = y_coord
+        self.max_labels = max_labels
+        self.color = color
+        self.collection = ax.vlines(self.x, ymin=-y_coord, ymax=y_coord, colors=color, linestyles='dashed')
+        self._texts = []
+        self._update(ax)
+        ax.callbacks.connect('xlim_changed', lambda changed_ax: self._update(changed_ax))
+
+    def _update(self, ax):
+        for text in self._texts:
+            text.remove()
+        self._texts = []
+        x_min, x_max = ax.get_xlim()
+        visible = np.flatnonzero((self.x >= x_min) & (self.x <= x_max))
+        if len(visible) > self.max_labels:
+            return
+        for i in visible:
+            self._texts.append(ax.text(self.x[i], self.y_coord, self.labels[i], rotation=90,
+                                       verticalalignment='bottom', horizontalalignment='right'))
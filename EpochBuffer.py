@@ -0,0 +1,97 @@
+import numpy as np
+
+
+class EpochBuffer:
+    """
+    Bounded sample buffer that cuts epochs around markers as soon as their window is complete.
+
+    Samples are appended with `push_samples` and markers with `push_marker`, in any interleaving. Each marker is
+    anchored to the last sample before its timestamp (as in ExperimentDataVEP) and its epoch covers tmin..tmax
+    around that sample. Only the most recent `capacity` samples are kept, so memory does not grow with the
+    recording; markers whose window has already left the buffer are counted in `dropped` and skipped.
+    """
+
+    def __init__(self, sfreq, n_channels, tmin=-0.2, tmax=0.5, max_marker_delay=2.0, baseline=True):
+        self.sfreq = sfreq
+        self.start_offset = int(round(tmin * sfreq))
+        self.stop_offset = int(round(tmax * sfreq)) + 1
+        self.baseline = baseline and tmin < 0
+        self.capacity = self.stop_offset - self.start_offset + int(max_marker_delay * sfreq)
+        # Twice the capacity, so samples only get shifted back to the front once per `capacity` pushed samples
+        self._data = np.empty((2 * self.capacity, n_channels))
+        self._time = np.empty(2 * self.capacity)
+        self._length = 0
+        self._first_sample = 0  # Absolute index of self._data[0]
+        self._pending = []  # Markers waiting for their anchor sample or the end of their window
+        self.dropped = 0
+
+    @property
+    def n_samples(self):
+        # Total number of samples pushed so far
+        return self._first_sample + self._length
+
+    def _append(self, time, data):
+        if self._length + len(time) > len(self._time):
+            shift = self._length - self.capacity
+            self._data[:self.capacity] = self._data[shift:self._length]
+            self._time[:self.capacity] = self._time[shift:self._length]
+            self._first_sample += shift
+            self._length = self.capacity
+        self._data[self._length:self._length + len(time)] = data
+        self._time[self._length:self._length + len(time)] = time
+        self._length += len(time)
+
+    def push_samples(self, time, data):
+        time = np.asarray(time, dtype=np.float64)
+        data = np.asarray(data)
+        epochs = []
+        # Large chunks are appended in pieces so pending windows never fall out of the buffer mid-chunk
+        for start in range(0, len(time), self.capacity):
+            self._append(time[start:start + self.capacity], data[start:start + self.capacity])
+            epochs.extend(self._collect())
+        return epochs
+
+    def window_end_time(self, marker_time):
+        # Timestamp of the last sample of a marker's epoch window, while that sample is still buffered
+        times = self._time[:self._length]
+        stop = np.searchsorted(times, marker_time, side='left') - 1 + self.stop_offset
+        return times[stop - 1] if 0 < stop <= self._length else np.nan
+
+    def push_marker(self, time, marker):
+        self._pending.append([time, marker, None])
+        return self._collect()
+
+    def flush(self):
+        # At the end of the recording: markers still waiting for samples never get a complete window
+        self.dropped += len(self._pending)
+        self._pending = []
+
+    def _collect(self):
+        # Returns a list of (marker, marker_time, epoch) for every marker whose window is now complete
+        epochs = []
+        still_pending = []
+        times = self._time[:self._length]
+        for entry in self._pending:
+            marker_time, marker, anchor = entry
+            if anchor is None:
+                if self._length == 0 or times[-1] < marker_time:
+                    still_pending.append(entry)
+                    continue
+                position = np.searchsorted(times, marker_time, side='left')
+                if position == 0 and self._first_sample > 0:
+                    self.dropped += 1
+                    continue
+                anchor = entry[2] = self._first_sample + position - 1
+            start = anchor + self.start_offset - self._first_sample
+            stop = anchor + self.stop_offset - self._first_sample
+            if start < 0:
+                self.dropped += 1
+            elif stop > self._length:
+                still_pending.append(entry)
+            else:
+                epoch = self._data[start:stop].T.copy()
+                if self.baseline:
+                    epoch -= epoch[:, :-self.start_offset + 1].mean(axis=1, keepdims=True)
+                epochs.append((marker, marker_time, epoch))
+        self._pending = still_pending
+        return epochs
@@ -0,0 +1,354 @@
+import io
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from ExperimentDataVEP import create_info
+from TrialTable import TRIAL_BEGIN, TRIAL_END
+
+FORMAT_VERSION = 1
+EXTENSIONS = {'.h5': 'hdf5', '.hdf5': 'hdf5', '.zarr': 'zarr', '.npz': 'npz'}
+
+
+def _format(path, format):
+    if format is None:
+        format = EXTENSIONS.get(os.path.splitext(path.rstrip('/\\'))[1].lower())
+    if format not in ('hdf5', 'zarr', 'npz'):
+        raise ValueError(f'Unknown export format for {path}, use one of {sorted(set(EXTENSIONS.values()))}')
+    return format
+
+
+def _json_default(value):
+    # NumPy scalars and arrays found in metadata and event ids
+    return value.tolist() if isinstance(value, (np.generic, np.ndarray)) else str(value)
+
+
+class _Hdf5File:
+    def __init__(self, path, mode):
+        try:
+            import h5py
+        except ImportError as e:
+            raise ImportError('Exporting to HDF5 needs h5py (pip install h5py), or use an .npz path') from e
+        self._file = h5py.File(path, mode)
+
+    def create(self, name, shape, dtype, chunks):
+        if 0 in shape:
+            # h5py takes no chunk shape for an empty dataset (e.g. the trials of a session without any)
+            self._file.create_dataset(name, shape=shape, dtype=dtype)
+            return
+        self._file.create_dataset(name, shape=shape, dtype=dtype, chunks=chunks, compression='gzip', shuffle=True)
+
+    def write(self, name, start, values):
+        self._file[name][start:start + len(values)] = values
+
+    def read(self, name, start, stop, columns=None):
+        if columns is None:
+            return self._file[name][start:stop]
+        # h5py only takes increasing indices along one axis
+        order = np.unique(columns)
+        return self._file[name][start:stop, list(order)][:, np.searchsorted(order, columns)]
+
+    def shape(self, name):
+        return self._file[name].shape
+
+    @property
+    def meta(self):
+        return json.loads(self._file.attrs['meta'])
+
+    @meta.setter
+    def meta(self, meta):
+        self._file.attrs['meta'] = json.dumps(meta, default=_json_default)
+
+    def close(self):
+        self._file.close()
+
+
+class _ZarrFile:
+    def __init__(self, path, mode):
+        try:
+            import zarr
+        except ImportError as e:
+            raise ImportError('Exporting to Zarr needs zarr (pip install zarr), or use an .npz path') from e
+        self._group = zarr.open_group(path, mode=mode)
+
+    def create(self, name, shape, dtype, chunks):
+        # create_array in zarr 3, create_dataset in zarr 2
+        create = getattr(self._group, 'create_array', None) or self._group.create_dataset
+        create(name, shape=shape, dtype=dtype, chunks=chunks)
+
+    def write(self, name, start, values):
+        self._group[name][start:start + len(values)] = values
+
+    def read(self, name, start, stop, columns=None):
+        if columns is None:
+            return self._group[name][start:stop]
+        return self._group[name].oindex[start:stop, list(columns)]
+
+    def shape(self, name):
+        return self._group[name].shape
+
+    @property
+    def meta(self):
+        return dict(self._group.attrs['meta'])
+
+    @meta.setter
+    def meta(self, meta):
+        self._group.attrs['meta'] = json.loads(json.dumps(meta, default=_json_default))
+
+    def close(self):
+        pass
+
+
+class _NpzFile:
+    """
+    Chunked arrays in a zip archive readable by np.load: every chunk (a block of rows of one column) is its own
+    deflated .npy member, so a read only decompresses the chunks it overlaps.
+    """
+
+    _META_MEMBER = 'meta.json'
+
+    def __init__(self, path, mode):
+        self._zip = zipfile.ZipFile(path, mode, compression=zipfile.ZIP_DEFLATED)
+        self._layout = {}  # {name: (shape, dtype, chunks)}
+        self._meta = {}
+        if mode == 'r':
+            stored = json.loads(self._zip.read(self._META_MEMBER))
+            self._layout = {name: (tuple(shape), np.dtype(dtype), tuple(chunks))
+                            for name, (shape, dtype, chunks) in stored.pop('_layout').items()}
+            self._meta = stored
+
+    def create(self, name, shape, dtype, chunks):
+        self._layout[name] = (tuple(shape), np.dtype(dtype), tuple(chunks))
+
+    def write(self, name, start, values):
+        # Writes must start on a row chunk boundary and cover whole row chunks (or end the array)
+        shape, dtype, chunks = self._layout[name]
+        for row in range(0, len(values), chunks[0]):
+            block = np.asarray(values[row:row + chunks[0]], dtype=dtype)
+            row_chunk = (start + row) // chunks[0]
+            if len(shape) == 1:
+                self._write_member(f'{name}/{row_chunk}.npy', block)
+                continue
+            for column in range(0, shape[1], chunks[1]):
+                self._write_member(f'{name}/{row_chunk}.{column // chunks[1]}.npy',
+                                   block[:, column:column + chunks[1]])
+
+    def _write_member(self, member, array):
+        buffer = io.BytesIO()
+        np.lib.format.write_array(buffer, np.ascontiguousarray(array))
+        self._zip.writestr(member, buffer.getvalue())
+
+    def _read_member(self, member):
+        with self._zip.open(member) as f:
+            return np.lib.format.read_array(f)
+
+    def read(self, name, start, stop, columns=None):
+        shape, dtype, chunks = self._layout[name]
+        start, stop, _ = slice(start, stop).indices(shape[0])
+        stop = max(start, stop)
+        row_chunks = range(start // chunks[0], -(-stop // chunks[0]))
+        if len(shape) == 1:
+            if not row_chunks:
+                return np.zeros(0, dtype=dtype)
+            rows = np.concatenate([self._read_member(f'{name}/{i}.npy') for i in row_chunks])
+            return rows[start - row_chunks.start * chunks[0]:stop - row_chunks.start * chunks[0]]
+        columns = np.arange(shape[1]) if columns is None else np.asarray(columns)
+        out = np.empty((stop - start, len(columns)) + shape[2:], dtype=dtype)
+        for column_chunk in np.unique(columns // chunks[1]):
+            wanted = np.flatnonzero(columns // chunks[1] == column_chunk)
+            for i in row_chunks:
+                block = self._read_member(f'{name}/{i}.{column_chunk}.npy')
+                lo, hi = max(start, i * chunks[0]), min(stop, (i + 1) * chunks[0])
+                out[lo - start:hi - start, wanted] = block[lo - i * chunks[0]:hi - i * chunks[0],
+                                                          columns[wanted] - column_chunk * chunks[1]]
+        return out
+
+    def shape(self, name):
+        return self._layout[name][0]
+
+    @property
+    def meta(self):
+        return self._meta
+
+    @meta.setter
+    def meta(self, meta):
+        self._meta = meta
+
+    def close(self):
+        if self._zip.mode == 'w':
+            layout = {name: (shape, dtype.str, chunks) for name, (shape, dtype, chunks) in self._layout.items()}
+            self._zip.writestr(self._META_MEMBER, json.dumps(dict(self._meta, _layout=layout), default=_json_default))
+        self._zip.close()
+
+
+_BACKENDS = {'hdf5': _Hdf5File, 'zarr': _ZarrFile, 'npz': _NpzFile}
+
+
+def _write_array(store, name, values, rows_per_chunk, columns_per_chunk=1):
+    values = np.asarray(values)
+    chunks = (max(1, min(rows_per_chunk, len(values))),)
+    if values.ndim > 1:
+        chunks += (max(1, min(columns_per_chunk, values.shape[1])),) + values.shape[2:]
+    store.create(name, values.shape, values.dtype, chunks)
+    if len(values):
+        store.write(name, 0, values)
+
+
+def export_session(data, path, format=None, epochs_per_chunk=32, seconds_per_chunk=60, dtype=np.float64):
+    """
+    Writes the epochs, events, markers, trials and filtered EEG of an ExperimentDataVEP, together with its filter
+    configuration and metadata, to an HDF5 (.h5, needs h5py), Zarr (.zarr, needs zarr) or chunked NPZ (.npz) file.
+    Epochs are chunked as blocks of `epochs_per_chunk` epochs of one channel, the continuous EEG as
+    `seconds_per_chunk` of one channel, so EpochStore can read channel subsets and ranges of either.
+    """
+    format = _format(path, format)
+    epochs = data._epochs
+    store = _BACKENDS[format](path, 'w')
+    try:
+        n_times = len(epochs.times)
+        store.create('epochs', (len(epochs), len(epochs.ch_names), n_times), dtype,
+                     (max(1, min(epochs_per_chunk, len(epochs))), 1, n_times))
+        # Written one chunk of epochs at a time, lazy (compact) epochs are never loaded at once
+        for start in range(0, len(epochs), epochs_per_chunk):
+            block = epochs[start:start + epochs_per_chunk]
+            store.write('epochs', start, block.get_data().astype(dtype, copy=False))
+        _write_array(store, 'event_samples', epochs.events[:, 0], len(epochs))
+        _write_array(store, 'event_codes', epochs.events[:, 2], len(epochs))
+        _write_array(store, 'event_times', data.eeg_time[epochs.events[:, 0]], len(epochs))
+
+        marker_names = sorted(set(map(str, data.marker_data)))
+        _write_array(store, 'marker_times', data.marker_time, max(1, len(data.marker_time)))
+        _write_array(store, 'marker_codes', np.searchsorted(marker_names, np.asarray(data.marker_data).astype(str)),
+                     max(1, len(data.marker_time)))
+
+        trials = data.trials
+        for name in ('start', 'stop', 'condition'):
+            _write_array(store, f'trial_{name}', getattr(trials, name), max(1, len(trials)))
+        _write_array(store, 'trial_marker_times', trials.marker_times.reshape(-1, 3), max(1, len(trials)), 3)
+
+        samples_per_chunk = int(seconds_per_chunk * data.sample_rate)
+        _write_array(store, 'eeg_time', data.eeg_time, samples_per_chunk)
+        store.create('eeg', data.eeg_data.shape, dtype, (min(samples_per_chunk, len(data.eeg_data)), 1))
+        for start in range(0, len(data.eeg_data), samples_per_chunk):
+            store.write('eeg', start, data.eeg_data[start:start + samples_per_chunk].astype(dtype))
+
+        baseline = data.baseline if data.baseline is not None else (None, 0 if data.tmin < 0 else None)
+        store.meta = dict(
+            format_version=FORMAT_VERSION,
+            ch_names=epochs.ch_names,
+            bads=epochs.info["bads"],
+            sfreq=data.sample_rate,
+            tmin=float(epochs.times[0]),
+            event_id=epochs.event_id,
+            conditions=trials.conditions,
+            marker_names=marker_names,
+            marker_dtype=np.asarray(data.marker_data).dtype.str,
+            filter=dict(min_frequency=data.min_frequency, max_frequency=data.max_frequency, notch_frequency=50,
+                        tmin=data.tmin, tmax=data.tmax, baseline=baseline),
+            metadata=data.metadata,
+        )
+    finally:
+        store.close()
+
+
+class EpochStore:
+    """
+    Reads a session written by export_session. Only the metadata is read on opening; get_data, eeg and trial
+    read just the chunks covering the requested epochs, samples and channels.
+    """
+
+    def __init__(self, path, format=None):
+        self.path = path
+        self._store = _BACKENDS[_format(path, format)](path, 'r')
+        meta = self._store.meta
+        self.ch_names = meta['ch_names']
+        self.bads = meta['bads']
+        self.sfreq = meta['sfreq']
+        self.event_id = meta['event_id']
+        self.conditions = meta['conditions']
+        self.marker_names = meta['marker_names']
+        self.marker_dtype = meta.get('marker_dtype')  # Missing from files written before it was stored
+        self.filter = meta['filter']
+        self.metadata = meta['metadata']
+        n_times = self._store.shape('epochs')[2]
+        self.times = meta['tmin'] + np.arange(n_times) / self.sfreq
+
+    def __len__(self):
+        return self._store.shape('epochs')[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._store.close()
+
+    def _picks(self, picks):
+        # Channel indices from None (all), names or indices
+        if picks is None:
+            return np.arange(len(self.ch_names))
+        return np.array([self.ch_names.index(pick) if isinstance(pick, str) else pick
+                         for pick in np.atleast_1d(picks)])
+
+    def _read(self, name, start=0, stop=None, columns=None):
+        return self._store.read(name, start, stop, columns)
+
+    @property
+    def events(self):
+        # (n_epochs, 3) MNE events array
+        samples, codes = self._read('event_samples'), self._read('event_codes')
+        return np.column_stack([samples, np.zeros_like(samples), codes])
+
+    @property
+    def event_times(self):
+        return self._read('event_times')
+
+    @property
+    def markers(self):
+        # (marker_time, marker_data) of the whole session, markers of the type they were recorded with
+        names = np.array(self.marker_names)
+        if self.marker_dtype is not None and len(names):
+            names = names.astype(self.marker_dtype)
+        return self._read('marker_times'), list(names[self._read('marker_codes')])
+
+    def get_data(self, picks=None, start=0, stop=None):
+        # Epochs [start, stop) as (n_epochs, n_channels, n_times), in volts
+        return self._read('epochs', start, stop, self._picks(picks))
+
+    def to_epochs(self, picks=None, start=0, stop=None):
+        # mne.EpochsArray of a range of epochs and channels, already filtered and baseline corrected
+        import mne
+        picks = self._picks(picks)
+        info = create_info(self.sfreq)
+        info["bads"] = [ch_name for ch_name in self.bads if ch_name in np.array(self.ch_names)[picks]]
+        info = mne.pick_info(info, picks)
+        events = self.events[start:stop]
+        event_id = {name: code for name, code in self.event_id.items() if np.any(events[:, 2] == code)}
+        return mne.EpochsArray(self.get_data(picks, start, stop), info, events=events, tmin=self.times[0],
+                               event_id=event_id, baseline=None)
+
+    def eeg(self, picks=None, start=0, stop=None):
+        # Filtered continuous EEG samples [start, stop) as (eeg_time, eeg_data (n_samples, n_channels))
+        return self._read('eeg_time', start, stop), self._read('eeg', start, stop, self._picks(picks))
+
+    @property
+    def n_trials(self):
+        return self._store.shape('trial_start')[0]
+
+    def trial(self, trial_index, picks=None):
+        # (eeg_time, eeg_data, marker_time, marker_data) like ExperimentDataVEP.trials[trial_index]
+        start = int(self._read('trial_start', trial_index, trial_index + 1)[0])
+        stop = int(self._read('trial_stop', trial_index, trial_index + 1)[0])
+        condition = int(self._read('trial_condition', trial_index, trial_index + 1)[0])
+        marker_time = self._read('trial_marker_times', trial_index, trial_index + 1)[0]
+        name = next(name for name, code in self.conditions.items() if code == condition)
+        eeg_time, eeg_data = self.eeg(picks, start, stop)
+        return eeg_time, eeg_data, marker_time, [TRIAL_BEGIN, name, TRIAL_END]
+
+    def __iter__(self):
+        for trial_index in range(self.n_trials):
+            yield self.trial(trial_index)
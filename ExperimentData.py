@@ -1,14 +1,77 @@
 import os
+from contextlib import nullcontext
 
+import numpy as np
 import pyxdf
 
+from ClockSync import ClockSync
+
+
+class TimeIndex:
+    """
+    Sorted view of a sample time vector for mapping timestamps to sample indices.
+
+    `first_at_or_after(t)` returns the same index as `np.argmax(time >= t)` but with one binary search per query
+    instead of a scan over the whole vector. Timestamps past the end map to `len(time)` rather than 0.
+    """
+
+    def __init__(self, time):
+        time = np.asarray(time)
+        # The running maximum is non-decreasing and crosses t exactly where the original vector first does,
+        # so it keeps argmax's "first sample at or after t" meaning even if the timestamps are not monotonic
+        self._sorted_time = time if np.all(time[1:] >= time[:-1]) else np.maximum.accumulate(time)
+
+    def __len__(self):
+        return len(self._sorted_time)
+
+    def first_at_or_after(self, times):
+        return np.searchsorted(self._sorted_time, times, side='left')
+
+    def last_before(self, times):
+        # Max timestamp that is less than the given time
+        return self.first_at_or_after(times) - 1
+
+
+def _matches(info, criteria):
+    return all(str(info.get(key)).lower() == str(value).lower() for key, value in criteria.items())
+
+
+def select_streams(stream_infos, eeg_stream=None, marker_stream=None):
+    """
+    Picks the EEG and marker streams from header-only stream infos (as returned by pyxdf.resolve_streams).
+    `eeg_stream` and `marker_stream` are dicts of header fields to match, e.g. {"name": "PsychopyMarkerStream"}.
+    By default the marker stream is PsychopyMarkerStream, or else the first stream of type Markers, and the EEG
+    stream is the first stream of type EEG, or else the regular-rate stream with the highest sampling rate.
+    """
+    def first(candidates, what):
+        for info in candidates:
+            return info
+        raise ValueError(f'No {what} stream among {[(info["name"], info["type"]) for info in stream_infos]}')
+
+    if marker_stream is not None:
+        marker = first((info for info in stream_infos if _matches(info, marker_stream)), f'marker {marker_stream}')
+    else:
+        marker = first([info for info in stream_infos if _matches(info, {"name": "PsychopyMarkerStream"})] +
+                       [info for info in stream_infos if _matches(info, {"type": "Markers"})], 'marker')
+    others = [info for info in stream_infos if info is not marker]
+    if eeg_stream is not None:
+        eeg = first((info for info in others if _matches(info, eeg_stream)), f'EEG {eeg_stream}')
+    else:
+        regular = sorted((info for info in others if info["nominal_srate"] > 0),
+                         key=lambda info: -info["nominal_srate"])
+        eeg = first([info for info in others if _matches(info, {"type": "EEG"})] + regular, 'EEG')
+    return eeg, marker
+
 
 class ExperimentData:
     def _read_metadata(self, original_filename):
-        # Read info of the first stream
+        # Read info of the EEG stream
         info = self._xdf_data[0]['info']
+        nominal_sample_rate = float(info['nominal_srate'][0])
+        effective_sample_rate = self._clocks[0].effective_srate(**self._timing)
         self.metadata = {
-            "effective_sample_rate": info['effective_srate'],
+            "effective_sample_rate": effective_sample_rate,
+            "sample_rate": nominal_sample_rate if nominal_sample_rate > 0 else effective_sample_rate,
             # "subject": {
             #     # "name": info['desc'][0]['subject'][0]['name'][0],
             #     # "alertness": info['desc'][0]['subject'][0]['alertness'][0],
@@ -22,8 +85,8 @@ class ExperimentData:
         }
 
     def _read_eeg_data(self):
-        # Read data of the first stream
-        self.eeg_time = self._xdf_data[0]['time_stamps']
+        # Read data of the EEG stream (first in _xdf_data)
+        self.eeg_time = self._clocks[0].time_stamps(**self._timing)
         # self._time_offset = min(self.eeg_time)
         self._time_offset = 0  # Assume already aligned
         self.eeg_time = self.eeg_time - self._time_offset
@@ -34,16 +97,73 @@ class ExperimentData:
         # self.counter_data = self._xdf_data[0]['time_series'][:, 15]
         # self.validation_indicator_data = self._xdf_data[0]['time_series'][:, 16]
 
+    @property
+    def sample_rate(self):
+        # Nominal rate of the EEG stream, falling back to the measured rate for irregular streams
+        return self.metadata["sample_rate"]
+
+    @property
+    def eeg_time_index(self):
+        # Built on first use and rebuilt whenever eeg_time is replaced
+        if getattr(self, '_eeg_time_index_source', None) is not self.eeg_time:
+            self._eeg_time_index = TimeIndex(self.eeg_time)
+            self._eeg_time_index_source = self.eeg_time
+        return self._eeg_time_index
+
     def _read_marker_data(self):
-        # Read data of the second stream
-        self.marker_time = self._xdf_data[1]['time_stamps']
+        # Read data of the marker stream (second in _xdf_data)
+        self.marker_time = self._clocks[1].time_stamps(**self._timing)
         self.marker_time = self.marker_time - self._time_offset
         self.marker_data = [x[0] for x in self._xdf_data[1]['time_series']]
 
-    def __init__(self, xdf_path):
-        self._xdf_data = pyxdf.load_xdf(xdf_path)[0]
-        # self._xdf_data = pyxdf.load_xdf(xdf_path, synchronize_clocks=False, dejitter_timestamps=False)[0]
-        self._xdf_data[0], self._xdf_data[1] = self._xdf_data[1], self._xdf_data[0]  # Swap streams if needed
-        self._read_eeg_data()
-        self._read_marker_data()
-        self._read_metadata(os.path.basename(xdf_path))
+    def _load_xdf(self, xdf_path):
+        # Only the stream headers are parsed to choose the streams, and only those two streams get decoded
+        eeg, marker = select_streams(pyxdf.resolve_streams(xdf_path), **self._stream_selection)
+        streams = pyxdf.load_xdf(xdf_path, select_streams=[eeg["stream_id"], marker["stream_id"]],
+                                 **self._load_options)[0]
+        by_id = {stream['info']['stream_id']: stream for stream in streams}
+        return [by_id[eeg["stream_id"]], by_id[marker["stream_id"]]]
+
+    def set_timing(self, synchronize_clocks=True, dejitter_timestamps=True):
+        # Switches eeg_time and marker_time to another timing variant, derived from the raw time stamps
+        self._timing = dict(synchronize_clocks=synchronize_clocks, dejitter_timestamps=dejitter_timestamps)
+        self.eeg_time = self._clocks[0].time_stamps(**self._timing) - self._time_offset
+        self.marker_time = self._clocks[1].time_stamps(**self._timing) - self._time_offset
+        self.metadata["effective_sample_rate"] = self._clocks[0].effective_srate(**self._timing)
+
+    def _measure(self, stage):
+        # Times a stage when instrumentation is switched on, does nothing otherwise
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.measure(stage, session=self._session_name)
+
+    def __init__(self, xdf_path, cache=None, instrumentation=None, eeg_stream=None, marker_stream=None,
+                 synchronize_clocks=True, dejitter_timestamps=True):
+        self.instrumentation = instrumentation
+        self.xdf_path = xdf_path
+        self._session_name = os.path.basename(xdf_path)
+        # Streams are kept with their raw time stamps and clock offsets, ClockSync derives the timing variants
+        self._load_options = dict(synchronize_clocks=False, dejitter_timestamps=False)
+        self._timing = dict(synchronize_clocks=synchronize_clocks, dejitter_timestamps=dejitter_timestamps)
+        self._stream_selection = dict(eeg_stream=eeg_stream, marker_stream=marker_stream)
+        cache_options = dict(self._load_options, **self._stream_selection)
+        self._xdf_data = None
+        if cache is not None:
+            with self._measure('cache_load'):
+                self._xdf_data = cache.load(xdf_path, cache_options)
+        cached = self._xdf_data is not None
+        if not cached:
+            with self._measure('xdf_load'):
+                self._xdf_data = self._load_xdf(xdf_path)
+        with self._measure('clock_sync'):
+            # Clock offset fits come from the cache when there is one, they are stored with the session otherwise
+            self._clocks = [ClockSync.from_stream(stream) for stream in self._xdf_data]
+            for stream, clock in zip(self._xdf_data, self._clocks):
+                stream['clock_fits'] = clock.fits
+        if cache is not None and not cached:
+            with self._measure('cache_store'):
+                cache.store(xdf_path, self._xdf_data, cache_options)
+        with self._measure('read_streams'):
+            self._read_eeg_data()
+            self._read_marker_data()
+            self._read_metadata(os.path.basename(xdf_path))
@@ -1,106 +1,237 @@
-import mne
+import logging
+
 import numpy as np
-from matplotlib import pyplot as plt
 
+from ConditionStats import condition_statistics
+from DecimatedPlot import DecimatedLine, MarkerOverlay
 from ExperimentData import ExperimentData
+from LazyStages import LazyPipeline, stage
+from Latency import best_lags, event_segments, lagged_correlation, trial_lags
+from Rejection import EpochRejection, epochs_peak_to_peak
+from Spectrum import compute_psd, target_frequency_power
+from TimeFrequency import epochs_tfr
+from TrialTable import TrialTable
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_NAMES = ['Fz', 'C3', 'Cz', 'C4', 'Pz', 'PO7', 'Oz', 'PO8']
+
+# mne and matplotlib are imported by the functions that use them: jobs that only need the ExperimentData arrays
+# or a cached result never pay for loading them
+
+
+def create_info(sfreq=250):
+    # Channel layout of the headset, with positions from the standard 10-20 montage
+    import mne
+    mne.set_log_level('WARNING')
+    info = mne.create_info(ch_names=CHANNEL_NAMES, ch_types=['eeg'] * len(CHANNEL_NAMES), sfreq=sfreq)
+    info.set_montage(mne.channels.make_standard_montage("standard_1020"))
+    return info
+
+
+def filter_picks(raw, by_channel=False):
+    # MNE filters a copy of all the picked channels at once, one channel at a time keeps that copy small
+    return [[ch_name] for ch_name in raw.ch_names] if by_channel else [None]
+
+
+def create_raw(eeg_data, sfreq=250, by_channel=False):
+    # Unfiltered RawArray (in volts) with the 50 Hz line noise removed. The samples are scaled straight into the
+    # single float64 (n_channels, n_samples) array that MNE filters in place, RawArray does not copy it again
+    import mne
+    data = np.empty((len(CHANNEL_NAMES), len(eeg_data)))
+    np.multiply(eeg_data[:, :len(CHANNEL_NAMES)].T, 1e-6, out=data)
+    raw = mne.io.RawArray(data, create_info(sfreq))
+    for picks in filter_picks(raw, by_channel):
+        raw.notch_filter(freqs=[50], picks=picks)
+    return raw
+
+
+STIMULUS_MARKERS = dict(standard=1, oddball=2)
 
 
-class ExperimentDataVEP(ExperimentData):
-    def __init__(self, xdf_path, min_frequency=0.5, max_frequency=30, tmin=-0.2, tmax=0.5, bad_ch=None):
-        super().__init__(xdf_path)
+def create_events(experiment_data):
+    # One event per marker, at the last EEG sample before the marker
+    marker_time = np.asarray(experiment_data.marker_time)
+    if any(isinstance(marker, str) for marker in experiment_data.marker_data):
+        # Named markers (status, trial-begin, ...) share timestamps, only the stimulus ones become events
+        codes = np.array([STIMULUS_MARKERS.get(marker, 0) for marker in experiment_data.marker_data])
+        eeg_start_indices = experiment_data.eeg_time_index.last_before(marker_time[codes > 0])
+        events = np.column_stack([eeg_start_indices, np.zeros_like(eeg_start_indices), codes[codes > 0]])
+        event_dict = {name: code for name, code in STIMULUS_MARKERS.items() if np.any(events[:, 2] == code)}
+        return events, event_dict
+    eeg_start_indices = experiment_data.eeg_time_index.last_before(marker_time)
+    events = np.column_stack([eeg_start_indices, np.zeros_like(eeg_start_indices), np.ones_like(eeg_start_indices)])
+    # event_dict = dict(standard=1, oddball=2)
+    event_dict = dict(standard=1)
+    return events, event_dict
+
+
+class ExperimentDataVEP(LazyPipeline, ExperimentData):
+    """
+    VEP analysis of one session.
+
+    Filtering, event building, epoching and trial extraction are lazy stages: nothing runs until the attribute
+    that needs it is read, and changing a parameter (min_frequency, max_frequency, tmin, tmax, baseline, bad_ch)
+    only recomputes the stages downstream of it.
+
+    With compact=True the session holds one float64 copy of the EEG (the filtered Raw, MNE filters in float64
+    only) next to a float32 copy of the unfiltered EEG channels: the Raw is filtered one channel at a time,
+    eeg_data is a read-only view of it and the epochs are not preloaded but cut from it when their data is read.
+    """
+
+    def __init__(self, xdf_path, min_frequency=0.5, max_frequency=30, tmin=-0.2, tmax=0.5, bad_ch=None,
+                 cache=None, baseline=None, instrumentation=None, eeg_stream=None, marker_stream=None,
+                 compact=False, synchronize_clocks=True, dejitter_timestamps=True):
+        self.compact = compact
+        super().__init__(xdf_path, cache=cache, instrumentation=instrumentation, eeg_stream=eeg_stream,
+                         marker_stream=marker_stream, synchronize_clocks=synchronize_clocks,
+                         dejitter_timestamps=dejitter_timestamps)
+        self.min_frequency = min_frequency
+        self.max_frequency = max_frequency
         self.tmin = tmin
         self.tmax = tmax
-        self._filter_data(min_frequency, max_frequency)
-        self._create_montage()
-        self._filter_markers()
-        self._read_trials()
-        if bad_ch is not None:
-            self._raw.info["bads"].append(bad_ch)
-            self._filter_markers()
-
-    def _filter_markers(self):
+        self.baseline = baseline  # None uses (None, 0), or the whole epoch when tmin >= 0
+        self.bad_ch = bad_ch
+        self.event_shift = None  # Onset correction in seconds, for the session or per event (see correct_latency)
+
+    def _run_stage(self, name, func):
+        with self._measure(name.lstrip('_')):
+            return func(self)
+
+    # ExperimentData stores the unfiltered samples through this setter, reading it gives the filtered samples
+    @property
+    def eeg_data(self):
+        return self._filtered_eeg_data
+
+    @eeg_data.setter
+    def eeg_data(self, value):
+        self._unfiltered_eeg_data = value
+
+    def _read_eeg_data(self):
+        super()._read_eeg_data()
+        if self.compact and not isinstance(self._unfiltered_eeg_data, np.memmap):
+            # Keep only the EEG channels, as float32, so the full decoded stream can be freed
+            self._unfiltered_eeg_data = np.ascontiguousarray(self._unfiltered_eeg_data, dtype=np.float32)
+            self._xdf_data[0]['time_series'] = self._unfiltered_eeg_data
+
+    @property
+    def _bads(self):
+        if self.bad_ch is None:
+            return []
+        return [self.bad_ch] if isinstance(self.bad_ch, str) else list(self.bad_ch)
+
+    @stage('bad_ch')
+    def _info(self):
+        # Enough for sensor plots, without touching the data
+        info = create_info(self.sample_rate)
+        info["bads"] = self._bads
+        return info
+
+    @stage('_unfiltered_eeg_data', 'min_frequency', 'max_frequency', 'compact')
+    def _filtered_raw(self):
+        raw = create_raw(self._unfiltered_eeg_data, self.sample_rate, by_channel=self.compact)
+        for picks in filter_picks(raw, by_channel=self.compact):
+            raw.filter(self.min_frequency, self.max_frequency, picks=picks)
+        return raw
+
+    @stage('_filtered_raw', 'bad_ch')
+    def _raw(self):
+        raw = self._filtered_raw
+        raw.info["bads"] = self._bads
+        return raw
+
+    @stage('_filtered_raw', 'compact')
+    def _filtered_eeg_data(self):
+        if self.compact:
+            # The Raw keeps its samples as (n_channels, n_samples), the transpose is a view of them
+            eeg_data = self._filtered_raw._data.T
+            eeg_data.flags.writeable = False
+            return eeg_data
+        return np.transpose(self._filtered_raw.get_data())
+
+    @stage('eeg_time', 'marker_time', 'marker_data', 'event_shift')
+    def _events(self):
         # Remove markers that aren't in our interest
-        print(self.marker_data)
-        events = []
+        logger.debug('Markers: %s', self.marker_data)
         # for i, marker in enumerate(self.marker_data):
         #     if marker in ['oddball', 'standard'] and self.marker_data[i + 1] == 'trial-end':
         #         eeg_start_index = np.argmax(self.eeg_time >= self.marker_time[
         #             i]) - 1  # Max timestamp that is less than current marker time (trial-begin)
         #         events.append([eeg_start_index, 0, 1 if marker == 'standard' else 2])
-        for i, marker in enumerate(self.marker_data):
-            eeg_start_index = np.argmax(self.eeg_time >= self.marker_time[i]) - 1
-            events.append([eeg_start_index, 0, 1])
-        events = np.array(events)
-        # TODO: Remove this
-        # Shift all events by 300 ms to account for the delay
-        # events[:, 0] += int(0.3 * self._raw.info['sfreq'])
-        # print(events.shape)
-        # event_dict = dict(standard=1, oddball=2)
-        event_dict = dict(standard=1)
-        self._epochs = mne.Epochs(self._raw, events, event_id=event_dict, tmin=self.tmin, tmax=self.tmax, preload=True,
-                                  baseline=(None, 0 if self.tmin < 0 else None))
-
-    def _create_montage(self):
-        montage = mne.channels.make_standard_montage("standard_1020")
-        self._raw.set_montage(montage)
-
-    def _filter_data(self, min_frequency, max_frequency):
-        mne.set_log_level('WARNING')
-        info = mne.create_info(ch_names=['Fz', 'C3', 'Cz', 'C4', 'Pz', 'PO7', 'Oz', 'PO8'], ch_types=['eeg'] * 8,
-                               sfreq=250)
-        raw = mne.io.RawArray([1e-6 * self.eeg_data[:, i] for i in range(8)], info)
-        raw.notch_filter(freqs=[50])
-        raw.filter(min_frequency, max_frequency)
-        self._raw = raw
-        self.eeg_data = np.transpose(raw.get_data())
-
-    def _read_trials(self):
-        self.trials = []
+        events, event_dict = create_events(self)
+        if self.event_shift is not None:
+            # Account for the delay between marker and stimulus, as estimated by estimate_latency
+            events[:, 0] += np.round(np.asarray(self.event_shift) * self.sample_rate).astype(int)
+        return events, event_dict
+
+    @stage('_filtered_raw', '_events', 'tmin', 'tmax', 'baseline', 'compact')
+    def _unmarked_epochs(self):
+        import mne
+        events, event_dict = self._events
+        baseline = self.baseline if self.baseline is not None else (None, 0 if self.tmin < 0 else None)
+        epochs = mne.Epochs(self._filtered_raw, events, event_id=event_dict, tmin=self.tmin, tmax=self.tmax,
+                            preload=not self.compact, baseline=baseline)
+        if self.compact:
+            # Settles which epochs fit in the recording, so len() works without loading them
+            epochs.drop_bad()
+        return epochs
+
+    @stage('_unmarked_epochs', 'bad_ch')
+    def _epochs(self):
+        # Marking a channel bad only updates the info, the epochs themselves are reused
+        epochs = self._unmarked_epochs
+        epochs.info["bads"] = self._bads
+        return epochs
+
+    @stage('_unmarked_epochs')
+    def _peak_to_peak(self):
+        # Computed once per epoching, whichever channels are bad and whatever thresholds get tried
+        return epochs_peak_to_peak(self._unmarked_epochs)
+
+    @stage('_peak_to_peak', 'bad_ch')
+    def rejection(self):
+        epochs = self._unmarked_epochs
+        return EpochRejection(self._peak_to_peak, epochs.events[:, 2], epochs.event_id, epochs.ch_names, self._bads)
+
+    def reject_epochs(self, reject=None, flat=None):
+        # The epochs that pass the thresholds, same as self._epochs.copy().drop_bad(reject, flat)
+        return self._epochs[self.rejection.keep(reject, flat)]
+
+    @stage('_filtered_eeg_data', 'eeg_time', 'marker_time', 'marker_data')
+    def trials(self):
         # The 'trial-begin' and 'trial-end' are the usual markers to look for.
         # However, if 'trial-begin' is followed by 'response-received-enter' before getting to 'trial-end', it isn't a real trial and must be skipped.
-        for i, marker in enumerate(self.marker_data):
-            if marker == 'trial-begin':
-                if self.marker_data[i + 1] in ['oddball', 'standard'] and self.marker_data[i + 2] == 'trial-end':
-                    eeg_start_index = np.argmax(self.eeg_time >= self.marker_time[
-                        i]) - 1  # Max timestamp that is less than current marker time (trial-begin)
-                    eeg_end_index = np.argmax(self.eeg_time >= self.marker_time[i + 2])
-                    marker_time = self.marker_time[i:i + 3]
-                    marker_data = self.marker_data[i:i + 3]
-                    self.trials.append(
-                        (self.eeg_time[eeg_start_index:eeg_end_index], self.eeg_data[eeg_start_index:eeg_end_index, :],
-                         marker_time, marker_data))
-                else:
-                    print(
-                        f'Incorrect trial, two following events are {self.marker_data[i + 1]} and {self.marker_data[i + 2]}')
-                    pass
+        return TrialTable(self.eeg_time, self.eeg_data, self.marker_time, self.marker_data, STIMULUS_MARKERS,
+                          self.eeg_time_index)
 
     def _plot_markers(self, ax, x_values, y_coord, labels):
-        for x, label in zip(x_values, labels):
-            ax.vlines(x, ymin=-y_coord, ymax=y_coord, colors='r', linestyles='dashed')
-            ax.text(x, y_coord, label, rotation=90, verticalalignment='bottom', horizontalalignment='right')
+        return MarkerOverlay(ax, x_values, y_coord, labels)
 
-    def plot_all_channels(self, duration=30):
-        self._raw.plot(duration=duration, scalings='auto')
+    def plot_all_channels(self, duration=30, show=True):
+        return self._raw.plot(duration=duration, scalings='auto', show=show)
 
     def plot_channel(self, channel_index=0, show_markers=False):
+        from matplotlib import pyplot as plt
         fig, ax = plt.subplots()
-        ax.plot(self.eeg_time, self.eeg_data[:, channel_index])
+        # Only a min/max envelope of the visible range is drawn, and redrawn on zoom
+        DecimatedLine(ax, self.eeg_time, self.eeg_data[:, channel_index])
         if show_markers:
             # Create vertical lines
             label_y_coord = np.max(np.abs(self.eeg_data[:, channel_index]))
             self._plot_markers(ax, self.marker_time, label_y_coord, self.marker_data)
 
-    def plot_fft(self, channel_index=0):
+    def plot_fft(self, channel_index=0, method='welch', fmax=None):
+        from matplotlib import pyplot as plt
+        freqs, psd = self.compute_psd(method=method, fmax=fmax)
         fig, ax = plt.subplots()
-        signal_fft = np.fft.rfft(self.eeg_data[:, channel_index])
-        signal_spectrum = abs(signal_fft)
-        freq = np.fft.rfftfreq(len(self.eeg_data[:, channel_index]), 1. / 250)  # 250 is the sampling rate
-        ax.plot(freq, signal_spectrum)
+        ax.semilogy(freqs, 1e6 * np.sqrt(psd[channel_index]))
         ax.set_xlabel('Frequency (Hz)')
-        ax.set_ylabel('Amplitude')
+        ax.set_ylabel('Amplitude (µV/√Hz)')
+        ax.set_title(self._raw.ch_names[channel_index])
 
     def plot_trial(self, trial_index, show_markers=True):
         # Plots a trial from 'trial-begin' to 'trial-end' event
+        from matplotlib import pyplot as plt
         eeg_time, eeg_data, marker_time, marker_data = self.trials[trial_index]
         fig, ax = plt.subplots()
         ax.plot(eeg_time - min(eeg_time), eeg_data)
@@ -109,19 +240,169 @@ class ExperimentDataVEP(ExperimentData):
             label_y_coord = np.max(np.abs(eeg_data))
             self._plot_markers(ax, marker_time - min(eeg_time), label_y_coord, marker_data)
 
-    def plot_sensors(self):
-        self._raw.plot_sensors(show_names=True)
+    def plot_sensors(self, show=True):
+        import mne
+        return mne.viz.plot_sensors(self._info, show_names=True, show=show)
 
-    def plot_epochs(self):
-        self._epochs.plot(scalings='auto', events=True, n_epochs=1)
+    def plot_epochs(self, n_epochs=1, show=True):
+        return self._epochs.plot(scalings='auto', events=True, n_epochs=n_epochs, show=show)
 
     def plot_epoch(self, epoch_index):
         # Plots a single epoch, starting from tmin before stimulus, and ending after tmax time
         self._epochs[epoch_index].plot(events=True, scalings='auto')
 
-    def plot_compare_conditions(self, confidence_interval=0.95, picks=None):
-        evokeds = dict(
-            standard=list(self._epochs["standard"].iter_evoked()),
-            # oddball=list(self._epochs["oddball"].iter_evoked()),
-        )
-        mne.viz.plot_compare_evokeds(evokeds, combine="mean", ci=confidence_interval, picks=picks)
+    @stage('_filtered_raw')
+    def _psd_cache(self):
+        return {}
+
+    @stage('_epochs')
+    def _epochs_psd_cache(self):
+        return {}
+
+    def compute_psd(self, method='welch', fmin=0, fmax=None, **kwargs):
+        """
+        PSD of every channel of the filtered recording (V²/Hz) as (freqs, psd) with psd (n_channels, n_freqs).
+        Uses the stream's sample rate; kwargs go to Spectrum.welch_psd or Spectrum.multitaper_psd.
+        Results are cached until the filtered data changes.
+        """
+        key = (method, fmin, fmax, tuple(sorted(kwargs.items())))
+        if key not in self._psd_cache:
+            self._psd_cache[key] = compute_psd(self._filtered_raw.get_data(), self.sample_rate, method, fmin,
+                                               np.inf if fmax is None else fmax, **kwargs)
+        return self._psd_cache[key]
+
+    def compute_epochs_psd(self, method='welch', fmin=0, fmax=None, **kwargs):
+        # Per-epoch spectra as (freqs, psd) with psd (n_epochs, n_channels, n_freqs), cached until re-epoching
+        key = (method, fmin, fmax, tuple(sorted(kwargs.items())))
+        if key not in self._epochs_psd_cache:
+            self._epochs_psd_cache[key] = compute_psd(self._epochs.get_data(), self.sample_rate, method, fmin,
+                                                      np.inf if fmax is None else fmax, **kwargs)
+        return self._epochs_psd_cache[key]
+
+    def ssvep_power(self, target_frequencies, per_epoch=False, method='welch', n_neighbors=3, **kwargs):
+        # Power and SNR at each target frequency, (n_channels, n_targets) or (n_epochs, n_channels, n_targets)
+        if per_epoch:
+            freqs, psd = self.compute_epochs_psd(method, **kwargs)
+        else:
+            freqs, psd = self.compute_psd(method, **kwargs)
+        power, snr = target_frequency_power(freqs, psd, np.atleast_1d(target_frequencies), n_neighbors)
+        return dict(target_frequencies=np.atleast_1d(target_frequencies), power=power, snr=snr)
+
+    @stage('_epochs')
+    def _tfr_cache(self):
+        return {}
+
+    def compute_tfr(self, freqs, method='morlet', n_cycles=7.0, time_bandwidth=4.0, decim=1, average=True,
+                    condition=None, picks=None, max_bytes=64 * 1024 ** 2, max_workers=None):
+        """
+        Time-frequency power and inter-trial coherence of the epochs (all of them, or those of `condition`) by
+        Morlet wavelets or DPSS multitapers, see TimeFrequency.epochs_tfr. Returns {times, freqs, ch_names, power,
+        itc, n_epochs}, power averaged over epochs unless average=False. Results are cached until re-epoching.
+        """
+        picks = self._pick_indices(picks)
+        key = (tuple(np.atleast_1d(freqs)), method, tuple(np.atleast_1d(n_cycles)), time_bandwidth, decim, average,
+               condition, tuple(picks))
+        if key not in self._tfr_cache:
+            epochs = self._epochs if condition is None else self._epochs[condition]
+            with self._measure('time_frequency'):
+                result = epochs_tfr(epochs.get_data(picks=picks), self.sample_rate, freqs, method, n_cycles,
+                                    time_bandwidth, decim=decim, average=average, max_bytes=max_bytes,
+                                    max_workers=max_workers)
+            result.update(times=epochs.times[::decim], ch_names=[epochs.ch_names[i] for i in picks],
+                          n_epochs=len(epochs))
+            self._tfr_cache[key] = result
+        return self._tfr_cache[key]
+
+    def estimate_latency(self, reference=None, max_lag=0.3, per_trial=False, max_jitter=0.05, picks=None):
+        """
+        Marker-to-response lag by cross-correlating epochs with an evoked template over a grid of lags.
+
+        `reference` is an evoked response (n_channels, n_times) over this session's tmin..tmax, e.g. from a session
+        recorded with a setup of known latency; the session lag (in seconds, positive when responses come late) is
+        where this session's evoked matches it best. Without a reference the lag is 0. With per_trial=True the
+        jitter of every event around the session lag is estimated too, within max_jitter. Events are taken as
+        they are before any event_shift. Returns {lag, score, trial_lags, trial_scores}.
+        """
+        import mne
+        sfreq = self.sample_rate
+        events, _ = create_events(self)
+        picks = mne.pick_types(self._info, eeg=True, exclude='bads') if picks is None else [
+            CHANNEL_NAMES.index(pick) if isinstance(pick, str) else pick for pick in picks]
+        start, stop = int(round(self.tmin * sfreq)), int(round(self.tmax * sfreq))
+        data = self._filtered_raw._data[picks]
+        result = dict(lag=0.0, score=None, trial_lags=None, trial_scores=None)
+        lag = 0
+        if reference is not None:
+            max_lag_samples = int(round(max_lag * sfreq))
+            segments, _ = event_segments(data, events[:, 0], start, stop, max_lag_samples)
+            correlation = lagged_correlation(segments.mean(axis=0), np.asarray(reference)[picks])
+            lag, score = best_lags(correlation, max_lag_samples)
+            result.update(lag=lag / sfreq, score=float(score))
+        if per_trial:
+            max_jitter_samples = int(round(max_jitter * sfreq))
+            segments, valid = event_segments(data, events[:, 0] + lag, start, stop, max_jitter_samples)
+            lags, scores = trial_lags(segments, max_jitter_samples)
+            # Events too close to the recording edges keep the session lag
+            result['trial_lags'] = np.zeros(len(events))
+            result['trial_lags'][valid] = lags / sfreq
+            result['trial_scores'] = np.full(len(events), np.nan)
+            result['trial_scores'][valid] = scores
+        return result
+
+    def correct_latency(self, reference=None, max_lag=0.3, per_trial=False, max_jitter=0.05, picks=None):
+        # Estimates the latency and shifts the events by it, the next epochs are cut at the corrected onsets
+        result = self.estimate_latency(reference, max_lag, per_trial, max_jitter, picks)
+        self.event_shift = result['lag'] if result['trial_lags'] is None else result['lag'] + result['trial_lags']
+        return result
+
+    def _pick_indices(self, picks):
+        # Channel indices for None (good EEG channels), channel names, channel types such as 'eeg' or indices
+        import mne
+        info = self._epochs.info
+        if picks is None:
+            return mne.pick_types(info, eeg=True, exclude='bads')
+        indices = []
+        for pick in [picks] if isinstance(picks, (str, int)) else picks:
+            if isinstance(pick, str) and pick not in info.ch_names:
+                indices.extend(mne.pick_types(info, **{pick: True}, exclude=[]))
+            else:
+                indices.append(info.ch_names.index(pick) if isinstance(pick, str) else int(pick))
+        return np.array(indices, dtype=int)
+
+    def compare_conditions(self, confidence_interval=0.95, picks=None, combine='mean', method='bootstrap',
+                           n_bootstrap=10000, seed=None):
+        """
+        Per-condition means and confidence intervals straight from the epochs array.
+        With combine='mean' the picked channels are averaged per trial first (as plot_compare_evokeds does),
+        with combine=None every channel keeps its own interval. Returns a dict with 'times', 'ch_names' and
+        'conditions', which maps each condition to its 'mean', 'lower', 'upper' arrays and 'n_trials'.
+        """
+        picks = self._pick_indices(picks)
+        ch_names = [self._epochs.ch_names[i] for i in picks]
+        kwargs = dict(n_bootstrap=n_bootstrap, seed=seed) if method == 'bootstrap' else {}
+        conditions = {}
+        for condition in self._epochs.event_id:
+            data = self._epochs[condition].get_data(picks=picks)
+            if combine == 'mean':
+                data = data.mean(axis=1)
+            elif combine is not None:
+                raise ValueError(f'Unknown combine {combine!r}, use "mean" or None')
+            conditions[condition] = condition_statistics(data, confidence_interval, method, **kwargs)
+        return dict(times=self._epochs.times, ch_names=ch_names, conditions=conditions)
+
+    def plot_compare_conditions(self, confidence_interval=0.95, picks=None, method='bootstrap'):
+        from matplotlib import pyplot as plt
+        comparison = self.compare_conditions(confidence_interval, picks=picks, method=method)
+        fig, ax = plt.subplots()
+        for condition, statistics in comparison['conditions'].items():
+            line, = ax.plot(comparison['times'], 1e6 * statistics['mean'], label=condition)
+            ax.fill_between(comparison['times'], 1e6 * statistics['lower'], 1e6 * statistics['upper'],
+                            color=line.get_color(), alpha=0.3, linewidth=0)
+        ax.axvline(0, color='k', linewidth=0.5)
+        ax.axhline(0, color='k', linewidth=0.5)
+        ax.set_xlabel('Time (s)')
+        ax.set_ylabel('µV')
+        ax.set_title(', '.join(comparison['ch_names']) if len(comparison['ch_names']) <= 4 else
+                     f'Mean of {len(comparison["ch_names"])} sensors')
+        ax.legend()
+        return fig
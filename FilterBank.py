@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from ExperimentData import ExperimentData
+from ExperimentDataVEP import create_events, create_raw
+
+
+class FilterBank:
+    """
+    Epochs for many (min_frequency, max_frequency) passbands from a single load of a session.
+
+    The XDF file is read, notch filtered, given a montage and turned into events once. Each passband is then
+    filtered from that shared notched signal; missing bands are filtered in parallel threads, in chunks of at
+    most as many bands as fit in `max_bytes`, and the filtered signals are kept in an LRU cache bounded by it.
+    `sweep` builds each chunk's epochs before filtering the next one, so memory grows with the cache size and
+    the epochs, not with the number of filtered recordings.
+    """
+
+    def __init__(self, data, tmin=-0.2, tmax=0.5, bad_ch=None, max_bytes=512 * 1024 ** 2, max_workers=None,
+                 cache=None):
+        if not isinstance(data, ExperimentData):
+            data = ExperimentData(data, cache=cache)
+        self.data = data
+        self.tmin = tmin
+        self.tmax = tmax
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        # An ExperimentDataVEP exposes its filtered samples as eeg_data, the notch must start from the raw ones
+        eeg_data = data._unfiltered_eeg_data if hasattr(data, '_unfiltered_eeg_data') else data.eeg_data
+        self._notched = create_raw(eeg_data, data.sample_rate)
+        if bad_ch is not None:
+            self._notched.info["bads"].append(bad_ch)
+        self._events, self._event_dict = create_events(data)
+        self._filtered = OrderedDict()
+        self._filtered_bytes = 0
+
+    def _filter(self, band):
+        return self._notched.copy().filter(*band)
+
+    def _remember(self, band, raw):
+        nbytes = raw._data.nbytes
+        if nbytes > self.max_bytes:
+            return
+        self._filtered[band] = raw
+        self._filtered_bytes += nbytes
+        while self._filtered_bytes > self.max_bytes:
+            _, evicted = self._filtered.popitem(last=False)
+            self._filtered_bytes -= evicted._data.nbytes
+
+    def _iter_filtered(self, bands):
+        # Yields (band, filtered Raw) per band, cached ones first; the others are filtered a chunk at a time, the
+        # next chunk only once the consumer has asked for more
+        bands = list(dict.fromkeys(tuple(band) for band in bands))
+        missing = []
+        for band in bands:
+            if band in self._filtered:
+                self._filtered.move_to_end(band)
+                yield band, self._filtered[band]
+            else:
+                missing.append(band)
+        if not missing:
+            return
+        chunk_size = max(1, self.max_bytes // self._notched._data.nbytes)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for start in range(0, len(missing), chunk_size):
+                chunk = missing[start:start + chunk_size]
+                for band, raw in zip(chunk, pool.map(self._filter, chunk)):
+                    self._remember(band, raw)
+                    yield band, raw
+
+    def filtered(self, bands):
+        # Returns {band: filtered Raw}; all of them are held at once, sweep() is lighter when epochs are the goal
+        return dict(self._iter_filtered(bands))
+
+    def epochs(self, band):
+        return self.sweep([band])[tuple(band)]
+
+    def sweep(self, bands):
+        # Returns {(min_frequency, max_frequency): Epochs} for every band
+        import mne
+        return {band: mne.Epochs(raw, self._events, event_id=self._event_dict, tmin=self.tmin, tmax=self.tmax,
+                                 preload=True, baseline=(None, 0 if self.tmin < 0 else None))
+                for band, raw in self._iter_filtered(bands)}
@@ -0,0 +1,106 @@
+import numpy as np
+
+from RunningStats import RunningStats
+
+
+class GrandAverage:
+    """
+    Group-level evoked responses accumulated one session at a time.
+
+    For every condition the accumulator keeps running statistics over all trials pooled, and per subject the
+    running mean of that subject's trials (the subject's evoked), so memory grows with the number of subjects
+    only by one evoked per condition, never by their data. Accumulators filled in different processes are
+    combined with `merge`, subjects present in both are merged as well.
+
+    Statistics are kept per channel and a session's bad channels are left out of them, so a dead or noisy
+    electrode in one session doesn't reach the group average; each channel is averaged over the subjects
+    where it was good.
+    """
+
+    def __init__(self):
+        self.info = None
+        self.times = None
+        self.trials = {}  # {condition: [RunningStats over single trials of all subjects, per channel]}
+        self.subjects = {}  # {subject: {condition: [RunningStats over that subject's trials, per channel]}}
+
+    def _channel_stats(self, target, condition):
+        return target.setdefault(condition, [RunningStats() for _ in self.info.ch_names])
+
+    def _check_layout(self, info, times):
+        if self.info is None:
+            # Bad channels differ between sessions, add_epochs leaves them out per session instead
+            self.info, self.times = info.copy(), np.asarray(times)
+            self.info["bads"] = []
+        elif (info.ch_names != self.info.ch_names or len(times) != len(self.times)
+              or not np.allclose(times, self.times)):
+            raise ValueError('Sessions with different channels or epoch windows cannot be averaged together')
+
+    def add_epochs(self, epochs, subject):
+        # Folds in every condition of an mne.Epochs, except its bad channels; the epochs can be dropped afterwards
+        self._check_layout(epochs.info, epochs.times)
+        good = [index for index, ch_name in enumerate(epochs.ch_names) if ch_name not in epochs.info["bads"]]
+        for condition in epochs.event_id:
+            data = epochs[condition].get_data()
+            trials = self._channel_stats(self.trials, condition)
+            subject_trials = self._channel_stats(self.subjects.setdefault(subject, {}), condition)
+            for index in good:
+                trials[index].update_batch(data[:, index])
+                subject_trials[index].update_batch(data[:, index])
+
+    def add_session(self, data, subject=None):
+        # An ExperimentDataVEP, by default each recording counts as its own subject
+        self.add_epochs(data._epochs, subject if subject is not None else data.metadata["original_filename"])
+
+    def merge(self, other):
+        if other.info is None:
+            return self
+        self._check_layout(other.info, other.times)
+        for condition, channels in other.trials.items():
+            for stats, other_stats in zip(self._channel_stats(self.trials, condition), channels):
+                stats.merge(other_stats)
+        for subject, conditions in other.subjects.items():
+            for condition, channels in conditions.items():
+                for stats, other_stats in zip(self._channel_stats(self.subjects.setdefault(subject, {}), condition),
+                                              channels):
+                    stats.merge(other_stats)
+        return self
+
+    def subject_evokeds(self, condition):
+        # {subject: evoked array (n_channels, n_times)} for the subjects that have the condition, NaN on the
+        # channels that were bad in all of that subject's sessions
+        return {subject: np.array([stats.mean if stats.count else np.full(len(self.times), np.nan)
+                                   for stats in conditions[condition]])
+                for subject, conditions in self.subjects.items() if condition in conditions}
+
+    def grand_average(self, condition):
+        """
+        Mean over subjects of the subject evokeds, with its standard error across subjects, as
+        {mean, sem, n_subjects, n_trials}; each subject weighs the same whatever their number of trials.
+        Every channel is averaged over the subjects where it was good, n_subjects and n_trials are per channel;
+        a channel no subject has is NaN.
+        """
+        channels = [RunningStats() for _ in self.info.ch_names]
+        for evoked in self.subject_evokeds(condition).values():
+            for index, stats in enumerate(channels):
+                if not np.isnan(evoked[index, 0]):
+                    stats.update(evoked[index])
+        missing = np.full(len(self.times), np.nan)
+        return dict(mean=np.array([stats.mean if stats.count else missing for stats in channels]),
+                    sem=np.array([stats.sem if stats.count else missing for stats in channels]),
+                    n_subjects=np.array([stats.count for stats in channels]),
+                    n_trials=np.array([stats.count for stats in self.trials[condition]]))
+
+    def to_evokeds(self):
+        """
+        One mne.EvokedArray per condition, nave being the number of subjects. A channel no subject has in some
+        condition is bad in all of them, as mne.write_evokeds needs the same bads throughout; its data is zero in
+        the conditions that lack it.
+        """
+        import mne
+        results = {condition: self.grand_average(condition) for condition in self.trials}
+        info = self.info.copy()
+        info["bads"] = [ch_name for index, ch_name in enumerate(info.ch_names)
+                        if any(result['n_subjects'][index] == 0 for result in results.values())]
+        return [mne.EvokedArray(np.nan_to_num(result['mean']), info.copy(), tmin=self.times[0], comment=condition,
+                                nave=len(self.subject_evokeds(condition)))
+                for condition, result in results.items()]
@@ -0,0 +1,93 @@
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class MemorySink:
+    # Keeps every record in a list, handy in notebooks and tests
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def summary(self):
+        # {stage: total wall time} over all records
+        totals = {}
+        for record in self.records:
+            totals[record['stage']] = totals.get(record['stage'], 0.0) + record['wall_time']
+        return totals
+
+
+class LoggingSink:
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('vep.instrumentation')
+        self.level = level
+
+    def emit(self, record):
+        memory = '' if record['peak_memory'] is None else f', peak {record["peak_memory"] / 1024 ** 2:.1f} MiB'
+        self.logger.log(self.level, '%s: %s took %.3f s wall, %.3f s CPU%s', record.get('session'), record['stage'],
+                        record['wall_time'], record['cpu_time'], memory)
+
+
+class JsonLinesSink:
+    # Appends one JSON object per stage to a file
+    def __init__(self, path):
+        self.path = path
+
+    def emit(self, record):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+
+class Instrumentation:
+    """
+    Records wall time, CPU time and peak memory of named stages and hands each record to the sinks.
+
+    Peak memory is measured with tracemalloc (which sees NumPy buffers) relative to the memory in use when the
+    stage started; tracing is switched on for the duration of the outermost stage only, and slows allocations
+    down while it is on (pass track_memory=False for pure timings). Stages may nest: an outer stage's times and
+    peak include its inner stages.
+    """
+
+    def __init__(self, *sinks, track_memory=True, **context):
+        self.sinks = list(sinks) if sinks else [MemorySink()]
+        self.track_memory = track_memory
+        self.context = context  # Extra fields added to every record, e.g. session=...
+        self._stack = []  # [start memory, running peak] per open stage
+
+    def emit(self, record):
+        for sink in self.sinks:
+            sink.emit(record)
+
+    @contextmanager
+    def measure(self, stage, **context):
+        started_tracing = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # Fold the outer stage's peak so far in before resetting the shared peak counter
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._stack.append([current, current])
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall_time, cpu_time = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            peak_memory = None
+            if self.track_memory:
+                start, running_peak = self._stack.pop()
+                peak = max(running_peak, tracemalloc.get_traced_memory()[1])
+                peak_memory = peak - start
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+                if started_tracing:
+                    tracemalloc.stop()
+            self.emit(dict(self.context, **context, stage=stage, wall_time=wall_time, cpu_time=cpu_time,
+                           peak_memory=peak_memory, timestamp=time.time()))
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+def event_segments(data, samples, start, stop, max_lag):
+    """
+    Windows of continuous `data` (n_channels, n_samples) from `start` - `max_lag` to `stop` + `max_lag` samples
+    around each event sample, as (n_events, n_channels, stop - start + 1 + 2 * max_lag), with a mask of the
+    events whose window fits in the recording (the others are left out of the array).
+    """
+    samples = np.asarray(samples)
+    length = stop - start + 1 + 2 * max_lag
+    first = samples + start - max_lag
+    valid = (first >= 0) & (first + length <= data.shape[1])
+    windows = np.lib.stride_tricks.sliding_window_view(data, length, axis=1)
+    return np.moveaxis(windows[:, first[valid]], 0, 1), valid
+
+
+def lagged_correlation(segments, template, workers=-1):
+    """
+    Pearson correlation, pooled over channels, between `template` (n_channels, n_times) and every window of the
+    same length in `segments` (..., n_channels, n_times + n_lags - 1), as (..., n_lags).
+
+    All epochs, channels and lags are done in one batched FFT: the template is zero-mean, so the DC offset of a
+    window does not change its product with it, and the window variances come from cumulative sums.
+    """
+    from scipy import fft
+    n_times = template.shape[-1]
+    length = segments.shape[-1]
+    template = template - template.mean(axis=-1, keepdims=True)
+    n_fft = fft.next_fast_len(length, real=True)
+    spectrum = fft.rfft(segments, n_fft, axis=-1, workers=workers) * np.conj(fft.rfft(template, n_fft, axis=-1))
+    products = fft.irfft(spectrum, n_fft, axis=-1, workers=workers)[..., :length - n_times + 1].sum(axis=-2)
+
+    def window_sums(x):
+        cumulative = np.concatenate([np.zeros(x.shape[:-1] + (1,)), np.cumsum(x, axis=-1)], axis=-1)
+        return cumulative[..., n_times:] - cumulative[..., :-n_times]
+
+    variances = (window_sums(segments ** 2) - window_sums(segments) ** 2 / n_times).sum(axis=-2)
+    norm = np.sqrt(np.maximum(variances, 0) * (template ** 2).sum())
+    return np.divide(products, norm, out=np.zeros_like(products), where=norm > 0)
+
+
+def best_lags(correlation, max_lag):
+    # Lag (in samples, positive when the response comes late) and correlation at the peak of each row
+    index = np.argmax(correlation, axis=-1)
+    return index - max_lag, np.take_along_axis(correlation, index[..., np.newaxis], axis=-1)[..., 0]
+
+
+def align(segments, lags, max_lag, n_times):
+    # The n_times-long window of every segment shifted by its lag, (n_events, n_channels, n_times)
+    offsets = (max_lag + np.asarray(lags))[:, np.newaxis, np.newaxis] + np.arange(n_times)
+    return np.take_along_axis(segments, np.broadcast_to(offsets, segments.shape[:2] + (n_times,)), axis=-1)
+
+
+def trial_lags(segments, max_lag, n_iter=10):
+    """
+    Per-trial latency jitter by Woody's method: every epoch is cross-correlated with the evoked response, the
+    evoked is rebuilt from the re-aligned epochs, until the lags stop changing. Lags are relative to the median
+    trial, so they do not move the session as a whole. Returns (lags in samples, correlation at each lag).
+    """
+    n_times = segments.shape[-1] - 2 * max_lag
+    lags = np.zeros(len(segments), dtype=int)
+    for _ in range(n_iter):
+        template = align(segments, lags, max_lag, n_times).mean(axis=0)
+        correlation = lagged_correlation(segments, template)
+        new_lags = best_lags(correlation, max_lag)[0]
+        new_lags = np.clip(new_lags - int(np.median(new_lags)), -max_lag, max_lag)
+        scores = correlation[np.arange(len(new_lags)), new_lags + max_lag]
+        if np.array_equal(new_lags, lags):
+            break
+        lags = new_lags
+    return lags, scores
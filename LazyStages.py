@@ -0,0 +1,74 @@
+class stage:
+    """
+    Decorator for a memoized pipeline stage.
+
+    The wrapped method runs on first attribute access and its result is kept until one of `depends` changes.
+    Dependencies are names of plain attributes (parameters) or of other stages. Assigning to a stage attribute
+    replaces its value and, like a parameter change, invalidates every stage downstream of it.
+    """
+
+    def __init__(self, *depends):
+        self.depends = depends
+
+    def __call__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        return self
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        values = obj.__dict__.setdefault('_stage_values', {})
+        if self.name not in values:
+            values[self.name] = obj._run_stage(self.name, self.func)
+        return values[self.name]
+
+    def __set__(self, obj, value):
+        obj.__dict__.setdefault('_stage_values', {})[self.name] = value
+        obj.invalidate(self.name, include_self=False)
+
+
+class LazyPipeline:
+    """Mixin that invalidates dependent stages whenever an attribute they depend on is reassigned."""
+
+    @classmethod
+    def _stage_dependents(cls):
+        # {name: stages that depend on it directly}, built once per class
+        if '_dependents' not in cls.__dict__:
+            dependents = {}
+            for klass in reversed(cls.__mro__):
+                for attribute in vars(klass).values():
+                    if isinstance(attribute, stage):
+                        for dependency in attribute.depends:
+                            dependents.setdefault(dependency, set()).add(attribute.name)
+            cls._dependents = dependents
+        return cls._dependents
+
+    def _run_stage(self, name, func):
+        return func(self)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self._stage_dependents():
+            self.invalidate(name, include_self=False)
+
+    def invalidate(self, name=None, include_self=True):
+        # Forget a stage (or, with no name, every stage) and everything computed from it
+        values = self.__dict__.get('_stage_values', {})
+        if name is None:
+            values.clear()
+            return
+        pending = [name] if include_self else list(self._stage_dependents().get(name, ()))
+        seen = set()
+        while pending:
+            current = pending.pop()
+            if current not in seen:
+                seen.add(current)
+                values.pop(current, None)
+                pending.extend(self._stage_dependents().get(current, ()))
+
+    def is_computed(self, name):
+        return name in self.__dict__.get('_stage_values', {})
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class OnlineFilter:
+    """
+    Causal notch + band-pass filter that keeps its state between calls.
+
+    Feeding a recording chunk by chunk gives exactly the same output as filtering it in one go. The filters are
+    IIR (second-order sections), so unlike MNE's zero-phase FIR filtering the output is delayed slightly.
+    """
+
+    def __init__(self, sfreq, n_channels, min_frequency=0.5, max_frequency=30, notch_frequency=50, order=4):
+        from scipy import signal
+        sections = []
+        if notch_frequency is not None and notch_frequency < sfreq / 2:
+            sections.append(signal.tf2sos(*signal.iirnotch(notch_frequency, Q=30, fs=sfreq)))
+        if min_frequency is not None and max_frequency is not None:
+            sections.append(signal.butter(order, [min_frequency, max_frequency], btype='bandpass', fs=sfreq,
+                                          output='sos'))
+        elif min_frequency is not None:
+            sections.append(signal.butter(order, min_frequency, btype='highpass', fs=sfreq, output='sos'))
+        elif max_frequency is not None:
+            sections.append(signal.butter(order, max_frequency, btype='lowpass', fs=sfreq, output='sos'))
+        self._sos = np.vstack(sections) if sections else None
+        self._n_channels = n_channels
+        self._zi = None
+
+    def reset(self):
+        self._zi = None
+
+    def process(self, data):
+        # data is (n_samples, n_channels), matching the layout of ExperimentData.eeg_data
+        from scipy import signal
+        data = np.asarray(data, dtype=np.float64)
+        if self._sos is None or len(data) == 0:
+            return data
+        if self._zi is None:
+            # Start in steady state for the first sample to avoid a large onset transient
+            self._zi = signal.sosfilt_zi(self._sos)[:, :, np.newaxis] * data[0]
+        filtered, self._zi = signal.sosfilt(self._sos, data, axis=0, zi=self._zi)
+        return filtered
@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+import pylsl
+
+from EpochBuffer import EpochBuffer
+from OnlineFilter import OnlineFilter
+from RunningStats import RunningStats
+
+# Marker values pushed by the psychopy experiments, plus the string markers of older recordings
+CONDITIONS = {1: 'standard', 2: 'oddball', 'standard': 'standard', 'oddball': 'oddball'}
+
+
+class OnlineVEP:
+    """
+    Live standard/oddball averages from an EEG inlet and the PsychopyMarkerStream inlet.
+
+    Every `poll` pulls whatever is available from both inlets, filters the EEG incrementally, cuts epochs once the
+    samples after their marker have arrived and folds each epoch into per-condition running statistics.
+    """
+
+    def __init__(self, marker_stream_name='PsychopyMarkerStream', eeg_stream_name=None, min_frequency=0.5,
+                 max_frequency=30, tmin=-0.2, tmax=0.5, n_channels=8, conditions=None, on_update=None):
+        self.marker_stream_name = marker_stream_name
+        self.eeg_stream_name = eeg_stream_name
+        self.min_frequency = min_frequency
+        self.max_frequency = max_frequency
+        self.tmin = tmin
+        self.tmax = tmax
+        self.n_channels = n_channels
+        self.conditions = CONDITIONS if conditions is None else conditions
+        self.on_update = on_update
+        self.stats = {}
+        # Seconds from the timestamp of the last sample of each trial's epoch window (on the LSL clock) to its
+        # updated average: transport, polling, filtering, epoching and the statistics update together
+        self.update_latencies = []
+
+    def connect(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        eeg_info = marker_info = None
+        while (eeg_info is None or marker_info is None) and time.monotonic() < deadline:
+            for info in pylsl.resolve_streams(wait_time=1.0):
+                if info.name() == self.marker_stream_name:
+                    marker_info = info
+                elif info.nominal_srate() > 0 and self.eeg_stream_name in (None, info.name()):
+                    eeg_info = info
+        if eeg_info is None or marker_info is None:
+            raise RuntimeError(f'Could not find the EEG and {self.marker_stream_name} streams within {timeout} s')
+        flags = pylsl.proc_clocksync | pylsl.proc_dejitter
+        self._eeg_inlet = pylsl.StreamInlet(eeg_info, max_buflen=30, processing_flags=flags)
+        self._marker_inlet = pylsl.StreamInlet(marker_info, processing_flags=pylsl.proc_clocksync)
+        # Subscribe now: samples pushed before an inlet's stream is open never reach it
+        self._eeg_inlet.open_stream(timeout)
+        self._marker_inlet.open_stream(timeout)
+        self.sfreq = eeg_info.nominal_srate()
+        self.times = np.arange(int(round(self.tmin * self.sfreq)), int(round(self.tmax * self.sfreq)) + 1) / self.sfreq
+        self._filter = OnlineFilter(self.sfreq, self.n_channels, self.min_frequency, self.max_frequency)
+        self._buffer = EpochBuffer(self.sfreq, self.n_channels, self.tmin, self.tmax)
+
+    def _update(self, epochs):
+        updated = []
+        for marker, marker_time, epoch in epochs:
+            condition = self.conditions.get(marker)
+            if condition is None:
+                continue
+            self.stats.setdefault(condition, RunningStats()).update(epoch)
+            if self.on_update is not None:
+                self.on_update(condition, self.stats[condition])
+            self.update_latencies.append(pylsl.local_clock() - self._buffer.window_end_time(marker_time))
+            updated.append(condition)
+        return updated
+
+    def poll(self):
+        # Returns the conditions whose averages were updated by this call
+        updated = []
+        samples, time_stamps = self._eeg_inlet.pull_chunk(timeout=0.0)
+        if time_stamps:
+            data = self._filter.process(1e-6 * np.asarray(samples)[:, :self.n_channels])
+            updated += self._update(self._buffer.push_samples(time_stamps, data))
+        markers, marker_times = self._marker_inlet.pull_chunk(timeout=0.0)
+        for marker, marker_time in zip(markers, marker_times):
+            updated += self._update(self._buffer.push_marker(marker_time, marker[0]))
+        return updated
+
+    def run(self, duration=None, interval=0.02):
+        started = time.monotonic()
+        while duration is None or time.monotonic() - started < duration:
+            self.poll()
+            time.sleep(interval)
+
+    def evoked(self, condition):
+        # Running (mean, sem, n_trials) for a condition, in volts
+        stats = self.stats[condition]
+        return stats.mean, stats.sem, stats.count
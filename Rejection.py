@@ -0,0 +1,78 @@
+import numpy as np
+
+
+def epochs_peak_to_peak(epochs):
+    # (n_epochs, n_channels) peak-to-peak amplitude, without copying preloaded epochs or loading lazy ones at once
+    if epochs.preload:
+        data = epochs.get_data(copy=False)
+        return data.max(axis=-1) - data.min(axis=-1)
+    return np.array([epoch.max(axis=-1) - epoch.min(axis=-1) for epoch in epochs]).reshape(-1, len(epochs.ch_names))
+
+
+def _criterion(value):
+    # Thresholds are given in volts, either as a number or MNE style as dict(eeg=...)
+    if isinstance(value, dict):
+        return value.get('eeg')
+    return value
+
+
+class EpochRejection:
+    """
+    Peak-to-peak artifact rejection answered from precomputed per-epoch, per-channel amplitudes.
+
+    Follows MNE's drop_bad: an epoch is dropped when a good channel's peak-to-peak amplitude is above `reject`
+    or below `flat`. Every query only compares the (n_epochs, n_channels) amplitude table against thresholds, so
+    trying thresholds, or sweeping many at once, never touches or copies the epoch data.
+    """
+
+    def __init__(self, peak_to_peak, event_codes, event_id, ch_names, bads=()):
+        self.peak_to_peak = peak_to_peak
+        self.event_codes = np.asarray(event_codes)
+        self.event_id = dict(event_id)
+        self.ch_names = list(ch_names)
+        self.bads = list(bads)
+        self._good = np.array([ch_name not in self.bads for ch_name in self.ch_names])
+
+    def bad_channels(self, reject=None, flat=None):
+        # (n_epochs, n_channels) mask of the good channels that get each epoch dropped
+        reject, flat = _criterion(reject), _criterion(flat)
+        bad = np.zeros(self.peak_to_peak.shape, dtype=bool)
+        if reject is not None:
+            bad |= self.peak_to_peak > reject
+        if flat is not None:
+            bad |= self.peak_to_peak < flat
+        bad &= self._good
+        return bad
+
+    def keep(self, reject=None, flat=None):
+        # Mask of the epochs that pass, usable to index the epochs
+        return ~self.bad_channels(reject, flat).any(axis=1)
+
+    def drop_counts(self, reject=None, flat=None):
+        # Dropped epochs in total, per channel (an epoch counts for every channel over threshold) and per condition
+        bad = self.bad_channels(reject, flat)
+        dropped = bad.any(axis=1)
+        return dict(
+            total=int(dropped.sum()),
+            channels={ch_name: int(count) for ch_name, count in zip(self.ch_names, bad.sum(axis=0))},
+            conditions={condition: int(dropped[self.event_codes == code].sum())
+                        for condition, code in self.event_id.items()},
+        )
+
+    def sweep(self, thresholds, flat=None):
+        """
+        Epochs kept for each of `thresholds` (rejection thresholds in volts), in total and per condition.
+        Only the largest good-channel amplitude of each epoch is compared, as one (n_thresholds, n_epochs) mask.
+        """
+        thresholds = np.asarray([_criterion(threshold) for threshold in thresholds], dtype=float)
+        good = self.peak_to_peak[:, self._good]
+        worst = good.max(axis=1) if good.shape[1] else np.zeros(len(good))
+        kept = worst[np.newaxis, :] <= thresholds[:, np.newaxis]
+        if _criterion(flat) is not None:
+            kept &= ~(good < _criterion(flat)).any(axis=1)
+        return dict(
+            thresholds=thresholds,
+            kept=kept.sum(axis=1),
+            conditions={condition: kept[:, self.event_codes == code].sum(axis=1)
+                        for condition, code in self.event_id.items()},
+        )
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+class RunningStats:
+    """
+    Running mean and variance of equally shaped arrays (Welford's algorithm).
+
+    Observations are folded in one at a time with `update`, or as a block with `update_batch`, and two
+    accumulators built on different data can be combined with `merge` (Chan et al.'s parallel update).
+    """
+
+    def __init__(self, shape=None):
+        self.count = 0
+        self.mean = None if shape is None else np.zeros(shape)
+        self._m2 = None if shape is None else np.zeros(shape)
+
+    def _init(self, shape):
+        if self.mean is None:
+            self.mean = np.zeros(shape)
+            self._m2 = np.zeros(shape)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        self._init(x.shape)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    def update_batch(self, x):
+        # x is (n_observations, *shape)
+        x = np.asarray(x, dtype=np.float64)
+        if len(x) == 0:
+            return
+        other = RunningStats()
+        other.count = len(x)
+        other.mean = x.mean(axis=0)
+        other._m2 = ((x - other.mean) ** 2).sum(axis=0)
+        self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self._m2 = other.count, other.mean.copy(), other._m2.copy()
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self._m2 = self._m2 + other._m2 + delta ** 2 * (self.count * other.count / count)
+        self.count = count
+        return self
+
+    @property
+    def variance(self):
+        # Unbiased sample variance; NaN until there are two observations
+        if self.count < 2:
+            return np.full_like(self.mean, np.nan)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def sem(self):
+        return np.sqrt(self.variance / self.count)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+
+class SessionCache:
+    """
+    On-disk cache of parsed XDF sessions.
+
+    Each entry is a directory holding the selected streams as .npy files (opened memory-mapped on load), with their
+    clock offsets when present, and a JSON file with the stream info and clock offset fits. Entries are keyed by file
+    path, size, mtime, content hash and the load options, so a modified file or a different set of options never hits
+    a stale entry.
+    """
+
+    _ARRAYS = ('time_stamps', 'time_series')
+    _OPTIONAL_ARRAYS = ('clock_times', 'clock_values')
+    _META_FILE = 'meta.json'
+
+    def __init__(self, cache_dir=None, max_bytes=2 * 1024 ** 3, max_age=30 * 24 * 3600):
+        if cache_dir is None:
+            cache_dir = os.environ.get('VEP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'vep'))
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._hashes = {}  # {(path, size, mtime): content hash}, so load and store after a miss hash the file once
+
+    @staticmethod
+    def _content_hash(xdf_path, block_size=1 << 20):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(xdf_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def key(self, xdf_path, options=None):
+        stat = os.stat(xdf_path)
+        fields = {
+            "path": os.path.abspath(xdf_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "options": options or {},
+        }
+        file_id = (fields["path"], fields["size"], fields["mtime"])
+        if file_id not in self._hashes:
+            self._hashes[file_id] = self._content_hash(xdf_path)
+        fields["content"] = self._hashes[file_id]
+        return hashlib.sha1(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, xdf_path, options=None):
+        # Returns the cached streams (same layout as pyxdf's stream dicts) or None on a miss
+        entry_dir = self._entry_dir(self.key(xdf_path, options))
+        meta_path = os.path.join(entry_dir, self._META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        streams = []
+        for i, info in enumerate(meta['streams']):
+            stream = {'info': info}
+            for name in self._ARRAYS:
+                stream[name] = np.load(os.path.join(entry_dir, f'{i}_{name}.npy'), mmap_mode='r')
+            for name in self._OPTIONAL_ARRAYS:
+                if os.path.exists(os.path.join(entry_dir, f'{i}_{name}.npy')):
+                    stream[name] = np.load(os.path.join(entry_dir, f'{i}_{name}.npy'))
+            if meta.get('clock_fits') is not None:
+                stream['clock_fits'] = meta['clock_fits'][i]
+            streams.append(stream)
+        os.utime(meta_path)  # Mark as recently used for eviction
+        return streams
+
+    def store(self, xdf_path, streams, options=None):
+        key = self.key(xdf_path, options)
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+        # Write into a temporary directory first so readers never see a half-written entry
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            for i, stream in enumerate(streams):
+                for name in self._ARRAYS:
+                    np.save(os.path.join(tmp_dir, f'{i}_{name}.npy'), np.asarray(stream[name]))
+                for name in self._OPTIONAL_ARRAYS:
+                    if name in stream:
+                        np.save(os.path.join(tmp_dir, f'{i}_{name}.npy'), np.asarray(stream[name], dtype=float))
+            meta = {
+                "source": os.path.abspath(xdf_path),
+                "options": options or {},
+                "streams": [stream['info'] for stream in streams],
+                "clock_fits": [stream.get('clock_fits') for stream in streams],
+            }
+            with open(os.path.join(tmp_dir, self._META_FILE), 'w') as f:
+                json.dump(meta, f, default=str)
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(entry_dir):
+                raise
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(name)
+            meta_path = os.path.join(entry_dir, self._META_FILE)
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(meta_path), size, entry_dir))
+        return entries
+
+    def evict(self):
+        # Drop entries older than max_age, then the least recently used ones until under max_bytes
+        now = time.time()
+        entries = []
+        for last_used, size, entry_dir in self._entries():
+            if self.max_age is not None and now - last_used > self.max_age:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            else:
+                entries.append((last_used, size, entry_dir))
+        if self.max_bytes is None:
+            return
+        total = sum(size for _, size, _ in entries)
+        for last_used, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def invalidate(self, xdf_path):
+        # Remove every entry built from this file, whatever options it was loaded with
+        source = os.path.abspath(xdf_path)
+        for _, _, entry_dir in self._entries():
+            with open(os.path.join(entry_dir, self._META_FILE)) as f:
+                if json.load(f)['source'] == source:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+
+    def clear(self):
+        for _, _, entry_dir in self._entries():
+            shutil.rmtree(entry_dir, ignore_errors=True)
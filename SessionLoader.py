@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ExperimentData import ExperimentData
+
+logger = logging.getLogger(__name__)
+
+
+def prefetch_file(path):
+    # Asks the OS to start reading a file into its page cache, so a later load finds it there; nothing is kept here
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # The load itself reports missing files
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+class SessionLoader:
+    """
+    Loads many sessions concurrently and hands them out as they finish, in completion order.
+
+    Up to `max_workers` files are read and parsed at once in a thread pool (file reads, decompression and most
+    array copies release the GIL), and at most `max_pending` sessions are loading or loaded but not yet handed
+    out: the next file is only started when a finished session has been taken, so memory is bounded by
+    `max_pending` sessions however many paths are given. The `prefetch` files queued after those are read ahead
+    into the OS page cache meanwhile. Sessions are `data_class(path, **options)`, e.g. ExperimentDataVEP with
+    cache=SessionCache(); an Instrumentation can't be shared between workers, pass it only with max_workers=1.
+
+        for data in SessionLoader(paths, max_workers=4):
+            ...  # epoching starts while later files are still being read
+        async for data in SessionLoader(paths):
+            ...
+
+    A session that fails to load is raised from the iteration, or with skip_errors=True logged, recorded in
+    `failed` ({path: exception}) and left out.
+    """
+
+    def __init__(self, paths, data_class=ExperimentData, max_workers=4, max_pending=None, prefetch=2,
+                 skip_errors=False, **options):
+        self.paths = list(paths)
+        self.data_class = data_class
+        self.max_workers = max_workers
+        self.max_pending = max(max_workers, max_pending or 2 * max_workers)
+        self.prefetch = prefetch
+        self.skip_errors = skip_errors
+        self.options = options
+        self.failed = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _load(self, path):
+        return self.data_class(path, **self.options)
+
+    def _result(self, path, future):
+        # The session, or None when its failure is skipped
+        try:
+            return future.result()
+        except Exception as e:
+            if not self.skip_errors:
+                raise
+            logger.warning('Could not load %s: %r', path, e)
+            self.failed[path] = e
+            return None
+
+    def _submitter(self, submit):
+        # Starts loads until max_pending are outstanding, prefetching the files queued next
+        queue = iter(self.paths)
+        upcoming = []
+
+        def refill(outstanding):
+            while outstanding < self.max_pending:
+                path = upcoming.pop(0) if upcoming else next(queue, None)
+                if path is None:
+                    break
+                submit(path)
+                outstanding += 1
+            while len(upcoming) < self.prefetch:
+                path = next(queue, None)
+                if path is None:
+                    break
+                prefetch_file(path)
+                upcoming.append(path)
+
+        return refill
+
+    def __iter__(self):
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
+        refill = self._submitter(lambda path: pending.setdefault(pool.submit(self._load, path), path))
+        try:
+            refill(0)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    data = self._result(pending.pop(future), future)
+                    if data is not None:
+                        yield data
+                    refill(len(pending))
+        finally:
+            # Stopping early waits for the loads in flight only
+            pool.shutdown(cancel_futures=True)
+
+    async def _aiterate(self):
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
+        refill = self._submitter(
+            lambda path: pending.setdefault(loop.run_in_executor(pool, self._load, path), path))
+        try:
+            refill(0)
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    data = self._result(pending.pop(future), future)
+                    if data is not None:
+                        yield data
+                    refill(len(pending))
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def __aiter__(self):
+        return self._aiterate()
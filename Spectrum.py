@@ -0,0 +1,77 @@
+import numpy as np
+
+
+def welch_psd(data, sfreq, n_per_seg=None, n_overlap=None, window='hann', max_bytes=32 * 1024 ** 2):
+    """
+    Welch power spectral density over the last axis of `data` (..., n_times), in units²/Hz.
+
+    All leading dimensions (channels, epochs) go through each FFT together. Segments are taken from a strided
+    view and transformed a block at a time, so at most `max_bytes` of segment data exist at once regardless of
+    the recording length. Matches scipy.signal.welch with constant detrending and mean averaging.
+    Returns (freqs, psd) with psd shaped (..., n_freqs).
+    """
+    from scipy import signal
+    data = np.asarray(data)
+    n_times = data.shape[-1]
+    n_per_seg = min(n_times, int(2 * sfreq) if n_per_seg is None else n_per_seg)
+    n_overlap = n_per_seg // 2 if n_overlap is None else n_overlap
+    step = n_per_seg - n_overlap
+    n_segments = (n_times - n_per_seg) // step + 1
+    taper = signal.get_window(window, n_per_seg)
+    segments = np.lib.stride_tricks.sliding_window_view(data, n_per_seg, axis=-1)[..., ::step, :][..., :n_segments, :]
+    leading = int(np.prod(data.shape[:-1]))
+    block = max(1, int(max_bytes // (16 * n_per_seg * max(1, leading))))
+    power = np.zeros(data.shape[:-1] + (n_per_seg // 2 + 1,))
+    for start in range(0, n_segments, block):
+        chunk = segments[..., start:start + block, :].astype(np.float64)
+        chunk -= chunk.mean(axis=-1, keepdims=True)
+        power += (np.abs(np.fft.rfft(chunk * taper, axis=-1)) ** 2).sum(axis=-2)
+    power /= n_segments * sfreq * (taper ** 2).sum()
+    # One-sided spectrum: fold the negative frequencies into the positive ones
+    power[..., 1:-1 if n_per_seg % 2 == 0 else None] *= 2
+    return np.fft.rfftfreq(n_per_seg, 1 / sfreq), power
+
+
+def multitaper_psd(data, sfreq, bandwidth=None, max_bytes=32 * 1024 ** 2):
+    # Multitaper PSD over the last axis via MNE, run over blocks of signals to bound the taper spectra in memory
+    from mne.time_frequency import psd_array_multitaper
+    data = np.asarray(data, dtype=np.float64)
+    flat = data.reshape(-1, data.shape[-1])
+    half_bandwidth = 4 if bandwidth is None else bandwidth * data.shape[-1] / (2 * sfreq)
+    n_tapers = max(1, int(2 * half_bandwidth))
+    block = max(1, int(max_bytes // (16 * n_tapers * data.shape[-1])))
+    psds = []
+    for start in range(0, len(flat), block):
+        psd, freqs = psd_array_multitaper(flat[start:start + block], sfreq, bandwidth=bandwidth, verbose=False)
+        psds.append(psd)
+    psd = np.concatenate(psds)
+    return freqs, psd.reshape(data.shape[:-1] + (len(freqs),))
+
+
+def compute_psd(data, sfreq, method='welch', fmin=0, fmax=np.inf, **kwargs):
+    if method == 'welch':
+        freqs, psd = welch_psd(data, sfreq, **kwargs)
+    elif method == 'multitaper':
+        freqs, psd = multitaper_psd(data, sfreq, **kwargs)
+    else:
+        raise ValueError(f'Unknown PSD method {method!r}, use "welch" or "multitaper"')
+    keep = (freqs >= fmin) & (freqs <= fmax)
+    return freqs[keep], psd[..., keep]
+
+
+def target_frequency_power(freqs, psd, target_frequencies, n_neighbors=3, skip=1):
+    """
+    SSVEP-style power at each target frequency (nearest bin) and its SNR against the mean of `n_neighbors` bins
+    on each side, leaving out `skip` bins next to the target. Returns (power, snr), each (..., n_targets).
+    """
+    targets = np.searchsorted(freqs, target_frequencies)
+    targets = np.clip(targets, 0, len(freqs) - 1)
+    # Step back where the previous bin is closer
+    closer = (targets > 0) & (np.abs(freqs[targets - 1] - target_frequencies) < np.abs(freqs[targets] -
+                                                                                     target_frequencies))
+    targets = targets - closer
+    offsets = np.concatenate([np.arange(-skip - n_neighbors, -skip), np.arange(skip + 1, skip + n_neighbors + 1)])
+    neighbors = np.clip(targets[:, np.newaxis] + offsets, 0, len(freqs) - 1)
+    power = psd[..., targets]
+    noise = psd[..., neighbors].mean(axis=-1)
+    return power, power / noise
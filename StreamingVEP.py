@@ -0,0 +1,56 @@
+import numpy as np
+
+from EpochBuffer import EpochBuffer
+from ExperimentData import select_streams
+from ExperimentDataVEP import STIMULUS_MARKERS
+from OnlineFilter import OnlineFilter
+from XdfReader import XdfReader
+
+
+class StreamingVEP:
+    """
+    Streaming counterpart of ExperimentDataVEP for recordings too long to load at once.
+
+    The XDF file is decoded chunk by chunk, the EEG is filtered causally with state kept between chunks, and
+    epochs are emitted as soon as the samples after their marker have been read. Peak memory is bounded by the
+    XDF chunk size and the epoch window rather than the recording length.
+    """
+
+    def __init__(self, xdf_path, min_frequency=0.5, max_frequency=30, tmin=-0.2, tmax=0.5, n_channels=8,
+                 max_marker_delay=2.0, eeg_stream=None, marker_stream=None):
+        self._reader = XdfReader(xdf_path)
+        eeg, marker = select_streams(list(self._reader.streams.values()), eeg_stream, marker_stream)
+        self._marker_stream_id = marker['stream_id']
+        self._eeg_stream_id = eeg['stream_id']
+        self.sfreq = eeg['nominal_srate']
+        self.n_channels = n_channels
+        self.min_frequency = min_frequency
+        self.max_frequency = max_frequency
+        self.tmin = tmin
+        self.tmax = tmax
+        self.max_marker_delay = max_marker_delay
+        self.times = np.arange(int(round(tmin * self.sfreq)), int(round(tmax * self.sfreq)) + 1) / self.sfreq
+        self._buffer = None  # Created by each iter_epochs
+
+    def iter_epochs(self):
+        # Yields (marker, marker_time, epoch) with epoch shaped (n_channels, n_times) in volts
+        eeg_filter = OnlineFilter(self.sfreq, self.n_channels, self.min_frequency, self.max_frequency)
+        self._buffer = EpochBuffer(self.sfreq, self.n_channels, self.tmin, self.tmax, self.max_marker_delay)
+        for stream_id, time_stamps, time_series in self._reader.iter_samples({self._eeg_stream_id,
+                                                                              self._marker_stream_id}):
+            if stream_id == self._eeg_stream_id:
+                data = eeg_filter.process(1e-6 * np.asarray(time_series[:, :self.n_channels], dtype=np.float64))
+                yield from self._buffer.push_samples(time_stamps, data)
+            else:
+                for marker_time, marker in zip(time_stamps, time_series):
+                    # As in create_events, of the named markers (status, trial-begin, ...) only stimuli are epoched
+                    if isinstance(marker[0], str) and marker[0] not in STIMULUS_MARKERS:
+                        continue
+                    yield from self._buffer.push_marker(marker_time, marker[0])
+        self._buffer.flush()
+
+    @property
+    def dropped(self):
+        # Number of markers whose epoch window could not be cut (too close to the recording edges or arrived too late),
+        # including those still waiting for samples when the recording ended
+        return 0 if self._buffer is None else self._buffer.dropped
@@ -0,0 +1,121 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def morlet_wavelets(sfreq, freqs, n_cycles=7.0, zero_mean=True):
+    # One "taper" of Morlet wavelets, as MNE builds them, and unit weights
+    from mne.time_frequency import morlet
+    return [morlet(sfreq, freqs, n_cycles, zero_mean=zero_mean)], np.ones((1, len(freqs)))
+
+
+def multitaper_wavelets(sfreq, freqs, n_cycles=7.0, time_bandwidth=4.0, zero_mean=True):
+    """
+    DPSS-tapered wavelets as MNE's tfr_array_multitaper builds them: floor(time_bandwidth - 1) tapers, each a
+    list of one wavelet per frequency n_cycles / freq long. Returns (wavelets, weights (n_tapers, n_freqs)).
+    """
+    from mne.time_frequency import dpss_windows
+    if time_bandwidth < 2.0:
+        raise ValueError('time_bandwidth should be >= 2.0 for good tapers')
+    n_tapers = int(np.floor(time_bandwidth - 1))
+    n_cycles = np.broadcast_to(n_cycles, (len(freqs),))
+    wavelets = [[] for _ in range(n_tapers)]
+    weights = np.empty((n_tapers, len(freqs)))
+    for k, (freq, cycles) in enumerate(zip(freqs, n_cycles)):
+        t_win = cycles / float(freq)
+        t = np.arange(0.0, t_win, 1.0 / sfreq)
+        oscillation = np.exp(2.0 * 1j * np.pi * freq * (t - t_win / 2.0))
+        tapers, concentrations = dpss_windows(len(t), time_bandwidth / 2.0, n_tapers, sym=False)
+        for m in range(n_tapers):
+            wavelet = oscillation * tapers[m]
+            if zero_mean:
+                wavelet -= wavelet.mean()
+            wavelets[m].append(wavelet / (np.sqrt(0.5) * np.linalg.norm(wavelet)))
+            weights[m, k] = np.sqrt(concentrations[m])
+    return wavelets, weights
+
+
+def _transform_block(data, kernels, weights, time_index, per_epoch_out=None):
+    """
+    Power summed over epochs and tapers (n_channels, n_freqs, n_out) and phase-locking sums per taper
+    (n_tapers, n_channels, n_freqs, n_out) of one block of epochs (n_block, n_channels, n_times). Every epoch,
+    channel and frequency of a taper goes through a single inverse FFT. With per_epoch_out, each epoch's power
+    is written there as well.
+    """
+    from scipy import fft
+    n_fft = kernels.shape[-1]
+    spectra = fft.fft(data, n_fft, axis=-1)[:, :, np.newaxis, :]
+    index = np.broadcast_to(time_index, data.shape[:2] + time_index.shape)
+    power_sum = 0
+    plf = np.empty((len(kernels),) + index.shape[1:], dtype=np.complex128)
+    for taper, (kernel, weight) in enumerate(zip(kernels, weights)):
+        # Same centring as np.convolve(..., mode='same') per wavelet, only the decimated samples are kept
+        coefs = np.take_along_axis(fft.ifft(spectra * kernel, axis=-1, overwrite_x=True), index, axis=-1)
+        magnitude = np.abs(coefs)
+        plf[taper] = np.divide(coefs, magnitude, out=np.zeros_like(coefs), where=magnitude > 0).sum(axis=0)
+        power = (weight[:, np.newaxis] * magnitude) ** 2
+        if per_epoch_out is not None:
+            per_epoch_out += power
+        power_sum = power_sum + power.sum(axis=0)
+    return power_sum, plf
+
+
+def epochs_tfr(data, sfreq, freqs, method='morlet', n_cycles=7.0, time_bandwidth=4.0, zero_mean=True, decim=1,
+               average=True, max_bytes=64 * 1024 ** 2, max_workers=None):
+    """
+    Time-frequency power and inter-trial coherence of epochs `data` (n_epochs, n_channels, n_times) by Morlet
+    wavelets or DPSS multitapers, matching MNE's tfr_array_morlet / tfr_array_multitaper with output
+    'avg_power_itc' (or 'power' with average=False).
+
+    The convolutions are done in the frequency domain for all channels and frequencies of a block of epochs at
+    once. Blocks run in a thread pool and are sized so that the coefficients of all the blocks in flight stay
+    within about `max_bytes`. Only every `decim`-th time sample is kept.
+    Returns {freqs, power, itc}, power (n_channels, n_freqs, n_out) or (n_epochs, n_channels, n_freqs, n_out)
+    without averaging, itc (n_channels, n_freqs, n_out).
+    """
+    from scipy import fft
+    freqs = np.asarray(freqs, dtype=float)
+    n_epochs, n_channels, n_times = data.shape
+    if method == 'morlet':
+        wavelets, weights = morlet_wavelets(sfreq, freqs, n_cycles, zero_mean)
+    elif method == 'multitaper':
+        wavelets, weights = multitaper_wavelets(sfreq, freqs, n_cycles, time_bandwidth, zero_mean)
+    else:
+        raise ValueError(f'Unknown time-frequency method {method!r}, use "morlet" or "multitaper"')
+    lengths = np.array([len(wavelet) for wavelet in wavelets[0]])
+    if lengths.max() > n_times:
+        raise ValueError(f'The longest wavelet ({lengths.max()} samples) is longer than the epochs ({n_times}), '
+                         'use fewer cycles or higher frequencies')
+    n_fft = fft.next_fast_len(n_times + lengths.max() - 1)
+    kernels = np.stack([fft.fft(np.array([np.pad(w, (0, n_fft - len(w))) for w in taper]), axis=-1)
+                        for taper in wavelets])
+    time_index = ((lengths - 1) // 2)[:, np.newaxis] + np.arange(0, n_times, decim)
+    n_out = time_index.shape[1]
+
+    per_epoch = None if average else np.zeros((n_epochs, n_channels, len(freqs), n_out))
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)  # ThreadPoolExecutor's default
+    n_blocks_in_flight = min(max_workers, n_epochs)
+    block = max(1, int(max_bytes // (n_blocks_in_flight * 16 * n_channels * len(freqs) * n_fft)))
+
+    def run(start):
+        out = None if per_epoch is None else per_epoch[start:start + block]
+        return _transform_block(np.asarray(data[start:start + block], dtype=np.float64), kernels, weights,
+                                time_index, out)
+
+    power = np.zeros((n_channels, len(freqs), n_out))
+    plf = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for block_power, block_plf in pool.map(run, range(0, n_epochs, block)):
+            power += block_power
+            plf = plf + block_plf
+    itc = np.abs(plf).sum(axis=0) / (n_epochs * len(kernels))
+    # MNE scales multitaper power by the taper weights
+    scale = 2 / (weights ** 2).sum(axis=0)[:, np.newaxis] if len(kernels) > 1 else 1
+    if average:
+        power = power * scale / n_epochs
+    else:
+        power = per_epoch
+        power *= scale
+    return dict(freqs=freqs, power=power, itc=itc)
@@ -0,0 +1,80 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TRIAL_BEGIN = 'trial-begin'
+TRIAL_END = 'trial-end'
+
+
+def encode_markers(marker_data, codes):
+    # Integer code per marker, 0 for markers missing from `codes`; each distinct marker is looked up once
+    if len(marker_data) == 0:
+        return np.zeros(0, dtype=np.int16)
+    names, inverse = np.unique(np.asarray(marker_data).astype(str), return_inverse=True)
+    return np.array([codes.get(name, 0) for name in names], dtype=np.int16)[inverse.ravel()]
+
+
+class TrialTable:
+    """
+    Trials of a session as arrays pointing into the session's EEG buffer.
+
+    A trial is a 'trial-begin', 'standard' or 'oddball', 'trial-end' run of markers. For every trial the table
+    keeps the EEG sample range (start, stop), the condition code and the index of its first marker, found with
+    array comparisons over integer-coded markers. Indexing gives the (eeg_time, eeg_data, marker_time,
+    marker_data) tuple of a trial, whose arrays are views of the session arrays.
+    """
+
+    def __init__(self, eeg_time, eeg_data, marker_time, marker_data, conditions, eeg_time_index):
+        self.eeg_time = eeg_time
+        self.eeg_data = eeg_data
+        self.marker_time = np.asarray(marker_time)
+        self.marker_data = marker_data
+        self.conditions = dict(conditions)  # {name: code}, codes > 0
+        begin, end = max(self.conditions.values()) + 1, max(self.conditions.values()) + 2
+        codes = encode_markers(marker_data, dict(self.conditions, **{TRIAL_BEGIN: begin, TRIAL_END: end}))
+
+        # A 'trial-begin' followed by 'response-received-enter' (or anything else) before 'trial-end' isn't a real
+        # trial; neither is one too close to the end of the recording to be followed by two markers
+        begins = np.flatnonzero(codes == begin)
+        complete = begins[begins + 2 < len(codes)]
+        valid = (codes[complete + 1] > 0) & (codes[complete + 1] < begin) & (codes[complete + 2] == end)
+        for i in complete[~valid]:
+            logger.warning('Incorrect trial, two following events are %s and %s', marker_data[i + 1],
+                           marker_data[i + 2])
+        for i in begins[len(complete):]:
+            logger.warning('Incomplete trial at the end of the recording, starting at marker %d', i)
+
+        self.marker_index = complete[valid]
+        self.condition = codes[self.marker_index + 1]
+        # From the last EEG sample before 'trial-begin' to the last one before 'trial-end', stop is exclusive
+        self.start = eeg_time_index.last_before(self.marker_time[self.marker_index])
+        self.stop = eeg_time_index.first_at_or_after(self.marker_time[self.marker_index + 2])
+
+    def __len__(self):
+        return len(self.marker_index)
+
+    def __getitem__(self, trial_index):
+        i = self.marker_index[trial_index]
+        start, stop = self.start[trial_index], self.stop[trial_index]
+        return (self.eeg_time[start:stop], self.eeg_data[start:stop], self.marker_time[i:i + 3],
+                self.marker_data[i:i + 3])
+
+    def __iter__(self):
+        for trial_index in range(len(self)):
+            yield self[trial_index]
+
+    def select(self, condition):
+        # Indices of the trials of one condition, by name
+        return np.flatnonzero(self.condition == self.conditions[condition])
+
+    @property
+    def marker_times(self):
+        # (n_trials, 3) times of the 'trial-begin', stimulus and 'trial-end' markers
+        return self.marker_time[self.marker_index[:, np.newaxis] + np.arange(3)]
+
+    @property
+    def durations(self):
+        # Seconds from 'trial-begin' to 'trial-end'
+        return self.marker_time[self.marker_index + 2] - self.marker_time[self.marker_index]
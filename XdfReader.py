@@ -0,0 +1,140 @@
+import struct
+from xml.etree.ElementTree import fromstring
+
+import numpy as np
+import pyxdf
+
+_FORMATS = dict(double64=np.float64, float32=np.float32, int32=np.int32, int16=np.int16, int8=np.int8,
+                int64=np.int64)
+
+_TAG_STREAM_HEADER = 2
+_TAG_SAMPLES = 3
+_TAG_CLOCK_OFFSET = 4
+_TAG_STREAM_FOOTER = 6
+
+
+def _xml_to_dict(element):
+    # Same nested layout as pyxdf's stream info: every child becomes a list
+    if len(element) == 0:
+        return element.text
+    result = {}
+    for child in element:
+        result.setdefault(child.tag, []).append(_xml_to_dict(child))
+    return result
+
+
+class _StreamState:
+    def __init__(self, info):
+        self.info = info
+        self.channel_count = int(info['channel_count'][0])
+        self.channel_format = info['channel_format'][0]
+        srate = float(info['nominal_srate'][0])
+        self.tdiff = 1.0 / srate if srate > 0 else 0.0
+        self.last_timestamp = 0.0
+        self.clock_offset = 0.0
+        if self.channel_format != 'string':
+            self.dtype = np.dtype(_FORMATS[self.channel_format]).newbyteorder('<')
+
+
+class XdfReader:
+    """
+    Incremental XDF reader that decodes one [Samples] chunk at a time.
+
+    Only the current chunk is held in memory. Timestamps are mapped to the recorder clock with the latest
+    [ClockOffset] seen for the stream, which is what an online client would do; it is not identical to pyxdf's
+    offline clock sync and dejitter.
+    """
+
+    def __init__(self, xdf_path):
+        self.xdf_path = xdf_path
+        self.streams = {stream['stream_id']: stream for stream in pyxdf.resolve_streams(xdf_path)}
+
+    @staticmethod
+    def _read_varlen_int(f):
+        nbytes = f.read(1)
+        if not nbytes:
+            raise EOFError
+        return struct.unpack({1: '<B', 4: '<I', 8: '<Q'}[nbytes[0]], f.read(nbytes[0]))[0]
+
+    @staticmethod
+    def _read_varlen_int_from(buffer, offset):
+        nbytes = buffer[offset]
+        return struct.unpack_from({1: '<B', 4: '<I', 8: '<Q'}[nbytes], buffer, offset + 1)[0], offset + 1 + nbytes
+
+    def _decode_samples(self, state, content):
+        n_samples, offset = self._read_varlen_int_from(content, 0)
+        stamps = np.empty(n_samples)
+        if state.channel_format == 'string':
+            values = []
+            for k in range(n_samples):
+                if content[offset]:
+                    stamps[k] = struct.unpack_from('<d', content, offset + 1)[0]
+                    offset += 9
+                else:
+                    stamps[k] = state.last_timestamp + state.tdiff
+                    offset += 1
+                state.last_timestamp = stamps[k]
+                sample = []
+                for _ in range(state.channel_count):
+                    length, offset = self._read_varlen_int_from(content, offset)
+                    sample.append(content[offset:offset + length].decode(errors='replace'))
+                    offset += length
+                values.append(sample)
+            return stamps, values
+        value_bytes = state.channel_count * state.dtype.itemsize
+        body = len(content) - offset
+        # Fast paths: every sample carries its timestamp, or none does
+        if body == n_samples * (9 + value_bytes):
+            record = np.dtype([('flag', 'u1'), ('stamp', '<f8'), ('values', state.dtype, (state.channel_count,))])
+            samples = np.frombuffer(content, dtype=record, count=n_samples, offset=offset)
+            stamps[:] = samples['stamp']
+            values = samples['values'].copy()
+        elif body == n_samples * (1 + value_bytes):
+            record = np.dtype([('flag', 'u1'), ('values', state.dtype, (state.channel_count,))])
+            samples = np.frombuffer(content, dtype=record, count=n_samples, offset=offset)
+            stamps[:] = state.last_timestamp + state.tdiff * np.arange(1, n_samples + 1)
+            values = samples['values'].copy()
+        else:
+            values = np.empty((n_samples, state.channel_count), dtype=state.dtype)
+            for k in range(n_samples):
+                if content[offset]:
+                    stamps[k] = struct.unpack_from('<d', content, offset + 1)[0]
+                    offset += 9
+                else:
+                    stamps[k] = state.last_timestamp + state.tdiff
+                    offset += 1
+                state.last_timestamp = stamps[k]
+                values[k] = np.frombuffer(content, dtype=state.dtype, count=state.channel_count, offset=offset)
+                offset += value_bytes
+        if n_samples:
+            state.last_timestamp = stamps[-1]
+        return stamps, values
+
+    def iter_samples(self, stream_ids=None):
+        # Yields (stream_id, time_stamps, time_series) for every [Samples] chunk of the selected streams in file order
+        states = {}
+        with open(self.xdf_path, 'rb') as f:
+            if f.read(4) != b'XDF:':
+                raise IOError(f'Invalid XDF file {self.xdf_path}')
+            while True:
+                try:
+                    chunk_length = self._read_varlen_int(f)
+                except EOFError:
+                    return
+                tag = struct.unpack('<H', f.read(2))[0]
+                if tag not in (_TAG_STREAM_HEADER, _TAG_SAMPLES, _TAG_CLOCK_OFFSET, _TAG_STREAM_FOOTER):
+                    f.seek(chunk_length - 2, 1)
+                    continue
+                stream_id = struct.unpack('<I', f.read(4))[0]
+                if stream_ids is not None and stream_id not in stream_ids:
+                    f.seek(chunk_length - 6, 1)
+                    continue
+                content = f.read(chunk_length - 6)
+                if tag == _TAG_STREAM_HEADER:
+                    states[stream_id] = _StreamState(_xml_to_dict(fromstring(content.decode('utf-8', 'replace'))))
+                elif tag == _TAG_CLOCK_OFFSET:
+                    states[stream_id].clock_offset = struct.unpack('<d', content[8:16])[0]
+                elif tag == _TAG_SAMPLES:
+                    state = states[stream_id]
+                    stamps, values = self._decode_samples(state, content)
+                    yield stream_id, stamps + state.clock_offset, values
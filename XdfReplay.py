@@ -0,0 +1,62 @@
+import threading
+import time
+
+import numpy as np
+import pylsl
+
+from XdfReader import XdfReader
+
+
+class XdfReplay:
+    """
+    Replays a recorded XDF file through local LSL outlets that mirror its streams.
+
+    Samples are pushed in file order and paced by their recorded timestamps (scaled by `speed`), so a client such
+    as OnlineVEP sees the same stream names, types and timing it would get from the live setup.
+    """
+
+    def __init__(self, xdf_path, speed=1.0, stream_ids=None):
+        self._reader = XdfReader(xdf_path)
+        self.speed = speed
+        self.stream_ids = stream_ids
+        self._outlets = {}
+        for stream_id, stream in self._reader.streams.items():
+            if stream_ids is not None and stream_id not in stream_ids:
+                continue
+            info = pylsl.StreamInfo(stream['name'], stream['type'], stream['channel_count'], stream['nominal_srate'],
+                                    stream['channel_format'], f'replay-{stream["source_id"] or stream_id}')
+            self._outlets[stream_id] = pylsl.StreamOutlet(info)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        start_clock = None
+        for stream_id, time_stamps, time_series in self._reader.iter_samples(self.stream_ids):
+            if self._stop.is_set():
+                return
+            if len(time_stamps) == 0:
+                continue
+            if start_clock is None:
+                start_clock, first_stamp = pylsl.local_clock(), time_stamps[0]
+            replay_stamps = start_clock + (np.asarray(time_stamps) - first_stamp) / self.speed
+            delay = replay_stamps[-1] - pylsl.local_clock()
+            if delay > 0:
+                self._stop.wait(delay)
+            values = time_series.tolist() if isinstance(time_series, np.ndarray) else time_series
+            outlet = self._outlets[stream_id]
+            for value, stamp in zip(values, replay_stamps):
+                outlet.push_sample(value, stamp)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def finished(self):
+        return self._thread is not None and not self._thread.is_alive()
@@ -0,0 +1,77 @@
+"""
+Compares the default and the compact (compact=True) ExperimentDataVEP data paths: peak and retained memory from
+loading to epoching, and how far the compact evoked responses are from the default ones. Both paths are run once
+before measuring, so neither carries the one-time imports.
+
+    python benchmarks/bench_compact.py --scale 8
+
+Exits with status 1 when an evoked response differs by more than --tolerance (relative to its peak amplitude).
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from ExperimentData import ExperimentData  # noqa: E402
+from ExperimentDataVEP import ExperimentDataVEP  # noqa: E402
+from synthetic_xdf import scaled_recording, write_xdf  # noqa: E402
+
+SOURCE = 'sub-P001_ses-S003_task-Default_run-001_eeg.xdf'
+
+
+def run_session(xdf_path, compact, tmin=-0.2, tmax=1.0):
+    # (peak MiB, retained MiB, {condition: evoked data}) for loading, filtering and epoching one session
+    gc.collect()
+    tracemalloc.start()
+    data = ExperimentDataVEP(xdf_path, tmin=tmin, tmax=tmax, compact=compact)
+    data.eeg_data
+    epochs = data._epochs
+    retained = tracemalloc.get_traced_memory()[0]
+    evokeds = {condition: epochs[condition].average().data for condition in epochs.event_id}
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 ** 2, retained / 1024 ** 2, evokeds
+
+
+def compare(name, xdf_path, tolerance):
+    default_peak, default_retained, default_evokeds = run_session(xdf_path, compact=False)
+    compact_peak, compact_retained, compact_evokeds = run_session(xdf_path, compact=True)
+    errors = [np.max(np.abs(compact_evokeds[c] - default_evokeds[c])) / np.max(np.abs(default_evokeds[c]))
+              for c in default_evokeds]
+    error = max(errors)
+    print(f'{name:<32}{default_peak:10.1f}{compact_peak:10.1f}{default_retained:10.1f}{compact_retained:10.1f}'
+          f'{compact_peak / default_peak:8.2f}{error:12.2e}', flush=True)
+    return error <= tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, nargs='*', default=[8],
+                        help=f'Also run synthetic recordings this many times longer than {SOURCE}')
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    args = parser.parse_args()
+
+    # Untimed: the first session pays for importing MNE and its filtering/epoching code, whichever case runs first
+    for compact in (False, True):
+        run_session(os.path.join(REPO_DIR, SOURCE), compact)
+    print(f'{"case":<32}{"peak":>10}{"compact":>10}{"kept":>10}{"compact":>10}{"ratio":>8}{"max error":>12}')
+    print(f'{"":<32}{"MiB":>10}{"MiB":>10}{"MiB":>10}{"MiB":>10}')
+    ok = compare(SOURCE[:30], os.path.join(REPO_DIR, SOURCE), args.tolerance)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = ExperimentData(os.path.join(REPO_DIR, SOURCE))
+        for factor in args.scale:
+            path = os.path.join(tmp_dir, f'synthetic_x{factor}.xdf')
+            write_xdf(path, scaled_recording(source, factor))
+            ok = compare(f'synthetic_x{factor}', path, args.tolerance) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Guards startup latency: imports each module in a fresh interpreter, reports the median import time over --runs
+runs and which heavy dependencies (mne, matplotlib, scipy) the import pulled in.
+
+    python benchmarks/bench_import.py --runs 5 --max-seconds 0.5
+
+Exits with status 1 when a module loads a heavy dependency or its median import time exceeds --max-seconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that short jobs and worker processes import before doing any MNE-backed or plotting work
+MODULES = ['ExperimentData', 'ExperimentDataVEP', 'SessionCache', 'EpochStore', 'GrandAverage', 'FilterBank',
+           'OnlineVEP', 'StreamingVEP', 'vep_batch']
+HEAVY = ['mne', 'matplotlib', 'scipy']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps(dict(seconds=seconds, heavy=[name for name in {heavy!r} if name in sys.modules])))
+"""
+
+
+def import_time(module):
+    # (seconds, heavy modules loaded) for one import in a new interpreter
+    output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)], cwd=REPO_DIR,
+                            check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result['seconds'], result['heavy']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f'{"module":<24}{"median s":>10}{"max s":>10}  heavy dependencies loaded')
+    ok = True
+    for module in args.modules:
+        runs = [import_time(module) for _ in range(args.runs)]
+        seconds = [run[0] for run in runs]
+        heavy = sorted(set().union(*(run[1] for run in runs)))
+        median = statistics.median(seconds)
+        print(f'{module:<24}{median:10.3f}{max(seconds):10.3f}  {", ".join(heavy) or "-"}', flush=True)
+        ok = ok and not heavy and median <= args.max_seconds
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
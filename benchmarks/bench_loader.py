@@ -0,0 +1,64 @@
+"""
+Loads and epochs a cohort of synthetic recordings (scaled up from a bundled one) serially and through
+SessionLoader, and reports the time until the first session is available and until all are epoched. One session
+is epoched before timing, so the serial baseline doesn't carry the one-time warm-up.
+
+    python benchmarks/bench_loader.py --sessions 8 --scale 4 --workers 1 2 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from ExperimentData import ExperimentData  # noqa: E402
+from ExperimentDataVEP import ExperimentDataVEP  # noqa: E402
+from SessionLoader import SessionLoader  # noqa: E402
+from synthetic_xdf import scaled_recording, write_xdf  # noqa: E402
+
+SOURCE = 'sub-P001_ses-S003_task-Default_run-001_eeg.xdf'
+
+
+def run(sessions, label):
+    # Epochs every session as it arrives, returns (seconds to the first session, total seconds, n_epochs)
+    start = time.perf_counter()
+    first = None
+    n_epochs = 0
+    for data in sessions:
+        if first is None:
+            first = time.perf_counter() - start
+        n_epochs += len(data._epochs)
+    total = time.perf_counter() - start
+    print(f'{label:<24}{first:10.2f}{total:10.2f}{n_epochs:10}', flush=True)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    options = dict(tmin=-0.2, tmax=1.0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        recording = scaled_recording(ExperimentData(os.path.join(REPO_DIR, SOURCE)), args.scale)
+        paths = []
+        for i in range(args.sessions):
+            paths.append(os.path.join(tmp_dir, f'session_{i}.xdf'))
+            write_xdf(paths[-1], recording)
+        # Untimed: the first session pays for importing MNE and its filtering/epoching code, whichever case runs first
+        len(ExperimentDataVEP(paths[0], **options)._epochs)
+        print(f'{"case":<24}{"first s":>10}{"total s":>10}{"epochs":>10}')
+        serial = run((ExperimentDataVEP(path, **options) for path in paths), 'serial')
+        for workers in args.workers:
+            total = run(SessionLoader(paths, ExperimentDataVEP, max_workers=workers, **options),
+                        f'SessionLoader x{workers}')
+            print(f'{"":<24}{"speedup":>10}{serial / total:10.2f}')
+
+
+if __name__ == '__main__':
+    main()
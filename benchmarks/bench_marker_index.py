@@ -0,0 +1,59 @@
+"""Compares the per-marker argmax scan with the searchsorted TimeIndex on synthetic multi-hour recordings."""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ExperimentData import TimeIndex  # noqa: E402
+
+
+def synthetic_times(hours, sample_rate=250, trial_period=1.5, seed=0):
+    rng = np.random.default_rng(seed)
+    n_samples = int(hours * 3600 * sample_rate)
+    eeg_time = np.arange(n_samples) / sample_rate + rng.normal(0, 1e-4, n_samples)
+    eeg_time.sort()
+    n_markers = int(hours * 3600 / trial_period)
+    marker_time = np.sort(rng.uniform(eeg_time[0], eeg_time[-1], n_markers))
+    return eeg_time, marker_time
+
+
+def argmax_scan(eeg_time, marker_time):
+    return np.array([np.argmax(eeg_time >= t) - 1 for t in marker_time])
+
+
+def time_call(func, *args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--hours', type=float, nargs='+', default=[0.5, 1, 2, 4])
+    parser.add_argument('--skip-scan-above', type=float, default=2,
+                        help='Skip the quadratic scan for recordings longer than this many hours')
+    args = parser.parse_args()
+
+    print(f'{"hours":>6} {"samples":>10} {"markers":>8} {"argmax [s]":>11} {"searchsorted [s]":>17} {"speedup":>8}')
+    for hours in args.hours:
+        eeg_time, marker_time = synthetic_times(hours)
+        index_time, fast = time_call(lambda: TimeIndex(eeg_time).last_before(marker_time))
+        if hours <= args.skip_scan_above:
+            scan_time, slow = time_call(argmax_scan, eeg_time, marker_time, repeat=1)
+            assert np.array_equal(slow, fast)
+            speedup = f'{scan_time / index_time:7.0f}x'
+            scan_time = f'{scan_time:11.3f}'
+        else:
+            scan_time, speedup = f'{"-":>11}', f'{"-":>8}'
+        print(f'{hours:6.1f} {len(eeg_time):10d} {len(marker_time):8d} {scan_time} {index_time:17.5f} {speedup}')
+
+
+if __name__ == '__main__':
+    main()
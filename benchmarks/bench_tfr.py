@@ -0,0 +1,76 @@
+"""
+Times the batched time-frequency decomposition (TimeFrequency.epochs_tfr) against MNE's tfr_array_morlet and
+tfr_array_multitaper on the epochs of a bundled recording repeated --repeat times, with its peak memory, and
+checks that power and inter-trial coherence agree.
+
+    python benchmarks/bench_tfr.py --repeat 1 4 --workers 1 4
+
+Exits with status 1 when power (relative to its peak) or ITC differ by more than --tolerance.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from mne.time_frequency import tfr_array_morlet, tfr_array_multitaper
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from ExperimentDataVEP import ExperimentDataVEP  # noqa: E402
+from TimeFrequency import epochs_tfr  # noqa: E402
+
+SOURCE = 'sub-P001_ses-S003_task-Default_run-001_eeg.xdf'
+REFERENCE = dict(morlet=tfr_array_morlet, multitaper=tfr_array_multitaper)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def compare(data, sfreq, freqs, method, decim, workers, max_bytes, tolerance):
+    n_cycles = freqs / 2
+    mne_time, reference = _timed(lambda: REFERENCE[method](data, sfreq, freqs, n_cycles=n_cycles, decim=decim,
+                                                           output='avg_power_itc'))
+    tracemalloc.start()
+    batched_time, result = _timed(lambda: epochs_tfr(data, sfreq, freqs, method, n_cycles, decim=decim,
+                                                     max_bytes=max_bytes, max_workers=workers))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    power_error = np.max(np.abs(result['power'] - reference.real)) / np.max(reference.real)
+    itc_error = np.max(np.abs(result['itc'] - reference.imag))
+    print(f'{len(data):>8}{method:>12}{decim:>6}{workers:>8}{mne_time:10.3f}{batched_time:10.3f}'
+          f'{mne_time / batched_time:8.1f}{peak / 1024 ** 2:10.1f}{max(power_error, itc_error):12.2e}', flush=True)
+    return max(power_error, itc_error) <= tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, nargs='*', default=[1, 4])
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 4])
+    parser.add_argument('--decim', type=int, default=2)
+    parser.add_argument('--max-bytes', type=int, default=64 * 1024 ** 2)
+    parser.add_argument('--tolerance', type=float, default=1e-9)
+    args = parser.parse_args()
+
+    session = ExperimentDataVEP(os.path.join(REPO_DIR, SOURCE), tmin=-0.2, tmax=1.0)
+    epochs = session._epochs.get_data(picks='eeg')
+    freqs = np.arange(4.0, 31.0)
+    print(f'{"epochs":>8}{"method":>12}{"decim":>6}{"workers":>8}{"mne s":>10}{"batched":>10}{"speedup":>8}'
+          f'{"peak MiB":>10}{"max error":>12}')
+    ok = True
+    for repeat in args.repeat:
+        data = np.concatenate([epochs] * repeat)
+        for method in REFERENCE:
+            for workers in args.workers:
+                ok = compare(data, session.sample_rate, freqs, method, args.decim, workers, args.max_bytes,
+                             args.tolerance) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Runs vep_batch on bundled recordings where a channel is bad only in the session that has the oddball condition,
+and checks that the batch succeeds and writes its summary and a grand average whose evokeds share one bad channel
+list, with that channel zeroed where no subject had it.
+
+    python benchmarks/check_batch.py
+
+Exits with status 1 when a check fails.
+"""
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from vep_batch import read_manifest, run_batch  # noqa: E402
+
+# Only the 10_vep session has oddball trials; Fz is bad there, so no subject has Fz for oddball
+MANIFEST = {"sessions": [
+    {"xdf_path": os.path.join(REPO_DIR, '10_vep_2025-08-29_16-17-45_1.xdf'), "bad_ch": "Fz"},
+    os.path.join(REPO_DIR, 'sub-P001_ses-S002_task-Default_run-001_eeg.xdf'),
+]}
+
+
+def main():
+    import mne
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manifest_path = os.path.join(tmp_dir, 'manifest.json')
+        with open(manifest_path, 'w') as f:
+            json.dump(MANIFEST, f)
+        output_dir = os.path.join(tmp_dir, 'output')
+        results = run_batch(read_manifest(manifest_path), output_dir, max_workers=2)
+        evokeds = {evoked.comment: evoked
+                   for evoked in mne.read_evokeds(os.path.join(output_dir, 'grand_average-ave.fif'), verbose=False)}
+        fz = evokeds['oddball'].ch_names.index('Fz')
+        checks = dict(
+            sessions=all(result["status"] == "ok" for result in results),
+            summary=os.path.exists(os.path.join(output_dir, 'batch_summary.json')),
+            conditions=sorted(evokeds) == ['oddball', 'standard'],
+            bads=all(evoked.info["bads"] == ['Fz'] for evoked in evokeds.values()),
+            missing_zeroed=not np.any(evokeds['oddball'].data[fz]),
+            present_kept=np.any(evokeds['standard'].data[fz]),
+        )
+    for name, ok in checks.items():
+        print(f'{name:<16}{"ok" if ok else "failed"}')
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
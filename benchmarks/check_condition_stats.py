@@ -0,0 +1,37 @@
+"""
+Checks that bootstrap_mean_ci gives the same interval whatever its memory budget, down to budgets too small for
+a single resample or feature per block, against the default budget on random trials.
+
+    python benchmarks/check_condition_stats.py
+
+Exits with status 1 when an interval differs.
+"""
+import os
+import sys
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from ConditionStats import bootstrap_mean_ci  # noqa: E402
+
+N_BOOTSTRAP = 500
+# Below 8 * N_BOOTSTRAP bytes no whole feature block fits, below 8 * n_trials no whole resample batch
+MAX_BYTES = [64 * 1024 ** 2, 8 * N_BOOTSTRAP, 8 * N_BOOTSTRAP - 1, 64, 1]
+
+
+def main():
+    data = np.random.default_rng(0).normal(size=(40, 3, 25))
+    expected = bootstrap_mean_ci(data, n_bootstrap=N_BOOTSTRAP, seed=1)
+    ok = True
+    for max_bytes in MAX_BYTES:
+        lower, upper = bootstrap_mean_ci(data, n_bootstrap=N_BOOTSTRAP, seed=1, max_bytes=max_bytes)
+        same = np.allclose(lower, expected[0]) and np.allclose(upper, expected[1])
+        print(f'max_bytes={max_bytes:<12}{"ok" if same else "differs"}')
+        ok = ok and same
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
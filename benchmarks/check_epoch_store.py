@@ -0,0 +1,75 @@
+"""
+Round-trips bundled recordings through export_session and EpochStore in every format and checks that epochs,
+events, markers, trials and EEG come back as ExperimentDataVEP has them in memory. Formats whose module (h5py,
+zarr) isn't installed are reported as skipped.
+
+    python benchmarks/check_epoch_store.py
+
+Exits with status 1 when anything read back differs.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from EpochStore import EpochStore, export_session  # noqa: E402
+from ExperimentDataVEP import ExperimentDataVEP  # noqa: E402
+
+# One session with string markers and trials, one with integer markers
+SESSIONS = ['10_vep_2025-08-29_16-17-45_1.xdf', 'sub-P001_ses-S003_task-Default_run-001_eeg.xdf']
+FORMATS = {'hdf5': ('.h5', 'h5py'), 'zarr': ('.zarr', 'zarr'), 'npz': ('.npz', None)}
+
+
+def _trial_equal(stored, trial):
+    return (all(np.array_equal(a, b) for a, b in zip(stored[:3], trial[:3]))
+            and list(stored[3]) == list(trial[3]))
+
+
+def differences(data, store):
+    # Names of what EpochStore reads back differently from the in-memory session
+    epochs = data._epochs
+    checks = dict(
+        epochs=np.allclose(store.get_data(), epochs.get_data()),
+        events=np.array_equal(store.events, epochs.events),
+        ch_names=store.ch_names == epochs.ch_names,
+        bads=store.bads == epochs.info["bads"],
+        marker_time=np.array_equal(store.markers[0], data.marker_time),
+        marker_data=store.markers[1] == list(data.marker_data)
+        and np.asarray(store.markers[1]).dtype.kind == np.asarray(data.marker_data).dtype.kind,
+        eeg=np.allclose(store.eeg()[1], data.eeg_data) and np.array_equal(store.eeg()[0], data.eeg_time),
+        trials=store.n_trials == len(data.trials)
+        and all(_trial_equal(store.trial(i), data.trials[i]) for i in range(len(data.trials))),
+    )
+    return [name for name, ok in checks.items() if not ok]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sessions', nargs='*', default=SESSIONS)
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for session in args.sessions:
+            data = ExperimentDataVEP(os.path.join(REPO_DIR, session), tmin=-0.2, tmax=1.0)
+            for format, (extension, module) in FORMATS.items():
+                if module is not None and importlib.util.find_spec(module) is None:
+                    print(f'{session:<52}{format:<6}skipped, {module} is not installed')
+                    continue
+                path = os.path.join(tmp_dir, os.path.splitext(session)[0] + extension)
+                export_session(data, path)
+                with EpochStore(path) as store:
+                    failed = differences(data, store)
+                print(f'{session:<52}{format:<6}{"differs: " + ", ".join(failed) if failed else "ok"}', flush=True)
+                ok = ok and not failed
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
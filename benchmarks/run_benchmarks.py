@@ -0,0 +1,141 @@
+"""
+Times every stage of the ExperimentData/ExperimentDataVEP pipeline on the bundled recordings and on synthetic
+recordings scaled up from one of them, and writes the results as JSON so runs can be compared between commits.
+
+    python benchmarks/run_benchmarks.py -o bench.json
+    python benchmarks/run_benchmarks.py -o new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from ExperimentData import ExperimentData  # noqa: E402
+from ExperimentDataVEP import ExperimentDataVEP  # noqa: E402
+from synthetic_xdf import scaled_recording, write_xdf  # noqa: E402
+
+BUNDLED = [
+    '10_vep_2025-08-29_16-17-45_1.xdf',
+    'MariaPC_LSL_100.xdf',
+    'MariaPC_lsl_100-onlyBT.xdf',
+    'sub-P001_ses-S002_task-Default_run-001_eeg.xdf',
+    'sub-P001_ses-S003_task-Default_run-001_eeg.xdf',
+]
+SCALE_SOURCE = 'sub-P001_ses-S003_task-Default_run-001_eeg.xdf'
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def benchmark_session(xdf_path, tmin=-0.2, tmax=1.0):
+    # Seconds per stage, reading the lazy stages one at a time in pipeline order
+    timings = {}
+    data = None
+
+    def load():
+        nonlocal data
+        data = ExperimentDataVEP(xdf_path, tmin=tmin, tmax=tmax)
+
+    timings['xdf_load'] = _timed(load)
+    timings['filtering'] = _timed(lambda: data._filtered_raw)
+    # The pipeline's _info stage, channel layout with the 10-20 montage and the bad channels
+    timings['info'] = _timed(lambda: data._info)
+    timings['event_building'] = _timed(lambda: data._events)
+    timings['epoching'] = _timed(lambda: data._epochs)
+    timings['trial_extraction'] = _timed(lambda: data.trials)
+    timings['total'] = sum(timings.values())
+    return dict(timings=timings, n_samples=len(data.eeg_time), n_markers=len(data.marker_time),
+                n_epochs=len(data._epochs))
+
+
+def run_case(name, xdf_path, repeat):
+    runs = []
+    for _ in range(repeat):
+        try:
+            runs.append(benchmark_session(xdf_path))
+        except Exception as e:
+            return dict(name=name, status='failed', error=repr(e), traceback=traceback.format_exc())
+    # Best of the repeats per stage, the usual way to filter out noise from other processes
+    timings = {stage: min(run['timings'][stage] for run in runs) for stage in runs[0]['timings']}
+    return dict(name=name, status='ok', timings=timings,
+                **{key: value for key, value in runs[0].items() if key != 'timings'})
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {case['name']: case for case in json.load(f)['cases']}
+    regressions = []
+    for case in results['cases']:
+        old = baseline.get(case['name'])
+        if case['status'] != 'ok' or old is None or old['status'] != 'ok':
+            continue
+        for stage, seconds in case['timings'].items():
+            ratio = seconds / old['timings'][stage] if old['timings'].get(stage) else np.nan
+            if ratio > 1 + threshold:
+                regressions.append((case['name'], stage, old['timings'][stage], seconds, ratio))
+    for name, stage, old_seconds, seconds, ratio in regressions:
+        print(f'REGRESSION {name} {stage}: {old_seconds:.4f} s -> {seconds:.4f} s ({ratio:.2f}x)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', default='bench_results.json')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=int, nargs='*', default=[4, 16],
+                        help=f'Synthetic recordings this many times longer than {SCALE_SOURCE}')
+    parser.add_argument('--compare', metavar='JSON', help='Earlier results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    cases = []
+    for name in BUNDLED:
+        cases.append(run_case(name, os.path.join(REPO_DIR, name), args.repeat))
+        print(f'{name}: {cases[-1]["status"]}', flush=True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = ExperimentData(os.path.join(REPO_DIR, SCALE_SOURCE))
+        for factor in args.scale:
+            path = os.path.join(tmp_dir, f'synthetic_x{factor}.xdf')
+            write_xdf(path, scaled_recording(source, factor))
+            cases.append(run_case(f'synthetic_x{factor}', path, args.repeat))
+            print(f'synthetic_x{factor}: {cases[-1]["status"]}', flush=True)
+
+    results = dict(commit=_git_commit(), created=time.strftime('%Y-%m-%dT%H:%M:%S'), python=sys.version.split()[0],
+                   platform=platform.platform(), cases=cases)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    stages = ['xdf_load', 'filtering', 'info', 'event_building', 'epoching', 'trial_extraction', 'total']
+    print(f'\n{"case":<48}' + ''.join(f'{stage:>17}' for stage in stages))
+    for case in cases:
+        if case['status'] == 'ok':
+            print(f'{case["name"]:<48}' + ''.join(f'{case["timings"][stage]:17.4f}' for stage in stages))
+        else:
+            print(f'{case["name"]:<48} failed: {case["error"]}')
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
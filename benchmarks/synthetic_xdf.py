@@ -0,0 +1,86 @@
+"""Writes XDF files from arrays, used to build scaled-up recordings for the benchmarks."""
+import struct
+
+import numpy as np
+
+_FORMATS = {np.dtype(np.float32): 'float32', np.dtype(np.float64): 'double64', np.dtype(np.int32): 'int32',
+            np.dtype(np.int16): 'int16', np.dtype(np.int8): 'int8', np.dtype(np.int64): 'int64'}
+
+
+def _varlen(n):
+    if n < 256:
+        return struct.pack('<BB', 1, n)
+    if n < 2 ** 32:
+        return struct.pack('<BI', 4, n)
+    return struct.pack('<BQ', 8, n)
+
+
+def _chunk(tag, content, stream_id=None):
+    if stream_id is not None:
+        content = struct.pack('<I', stream_id) + content
+    return _varlen(len(content) + 2) + struct.pack('<H', tag) + content
+
+
+def _stream_header(stream):
+    return (f'<?xml version="1.0"?><info><name>{stream["name"]}</name><type>{stream["type"]}</type>'
+            f'<channel_count>{stream["time_series"].shape[1]}</channel_count>'
+            f'<nominal_srate>{stream["nominal_srate"]}</nominal_srate>'
+            f'<channel_format>{_FORMATS[stream["time_series"].dtype]}</channel_format>'
+            f'<source_id>{stream["name"]}</source_id><created_at>0</created_at></info>').encode()
+
+
+def _samples(time_stamps, time_series):
+    record = np.dtype([('flag', 'u1'), ('stamp', '<f8'), ('values', time_series.dtype.newbyteorder('<'),
+                                                          (time_series.shape[1],))])
+    samples = np.empty(len(time_stamps), dtype=record)
+    samples['flag'] = 8
+    samples['stamp'] = time_stamps
+    samples['values'] = time_series
+    return _varlen(len(time_stamps)) + samples.tobytes()
+
+
+def write_xdf(path, streams, chunk_seconds=1.0):
+    """
+    Writes numeric streams to an XDF file. Each stream is a dict with name, type, nominal_srate, time_stamps and a
+    2-D time_series; stream ids follow list order, starting at 1. Samples are interleaved across streams in chunks
+    of `chunk_seconds`, like a recorder would write them, with a zero clock offset per chunk.
+    """
+    start = min(stream['time_stamps'][0] for stream in streams if len(stream['time_stamps']))
+    stop = max(stream['time_stamps'][-1] for stream in streams if len(stream['time_stamps']))
+    with open(path, 'wb') as f:
+        f.write(b'XDF:')
+        f.write(_chunk(1, b'<?xml version="1.0"?><info><version>1.0</version></info>'))
+        for stream_id, stream in enumerate(streams, start=1):
+            f.write(_chunk(2, _stream_header(stream), stream_id))
+        for chunk_start in np.arange(start, stop + chunk_seconds, chunk_seconds):
+            for stream_id, stream in enumerate(streams, start=1):
+                time_stamps = stream['time_stamps']
+                lo, hi = np.searchsorted(time_stamps, [chunk_start, chunk_start + chunk_seconds])
+                if hi > lo:
+                    f.write(_chunk(3, _samples(time_stamps[lo:hi], np.asarray(stream['time_series'][lo:hi])),
+                                   stream_id))
+                    f.write(_chunk(4, struct.pack('<dd', time_stamps[hi - 1], 0.0), stream_id))
+        for stream_id, stream in enumerate(streams, start=1):
+            footer = (f'<?xml version="1.0"?><info><first_timestamp>{stream["time_stamps"][0]}</first_timestamp>'
+                      f'<last_timestamp>{stream["time_stamps"][-1]}</last_timestamp>'
+                      f'<sample_count>{len(stream["time_stamps"])}</sample_count></info>').encode()
+            f.write(_chunk(6, footer, stream_id))
+
+
+def scaled_recording(experiment_data, factor):
+    """
+    Streams for a recording `factor` times as long as `experiment_data`, made by repeating its EEG and markers
+    back to back. The marker stream comes first, as in the Unicorn recordings the pipeline was written for.
+    """
+    duration = experiment_data.eeg_time[-1] - experiment_data.eeg_time[0] + 1 / experiment_data.sample_rate
+    shifts = np.arange(factor) * duration
+    eeg_time = (experiment_data.eeg_time[np.newaxis, :] + shifts[:, np.newaxis]).ravel()
+    marker_time = (experiment_data.marker_time[np.newaxis, :] + shifts[:, np.newaxis]).ravel()
+    eeg_data = np.tile(np.asarray(experiment_data._xdf_data[0]['time_series']), (factor, 1))
+    markers = np.tile(np.asarray(experiment_data.marker_data, dtype=np.int32).reshape(-1, 1), (factor, 1))
+    return [
+        dict(name='PsychopyMarkerStream', type='Markers', nominal_srate=0, time_stamps=marker_time,
+             time_series=markers),
+        dict(name='SyntheticEEG', type='EEG', nominal_srate=experiment_data.sample_rate, time_stamps=eeg_time,
+             time_series=eeg_data.astype(np.float32)),
+    ]
@@ -7,8 +7,11 @@ from psychopy import visual, core, event, logging, sound
 from psychopy.visual import Window
 from psychopy.hardware import keyboard
 from pylsl import StreamInfo, StreamOutlet
+import os
 import random
 
+from stimulus_engine import Event, StimulusEngine
+
 # =========================
 # Config (tweak as needed)
 # =========================
@@ -36,6 +39,9 @@ bg_color = [0.5, 0.5, 0.5]  # grey
 MARK_STANDARD = 1
 MARK_ODDBALL = 2
 
+# Flip and marker timing logs
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timing_logs')
+
 # =========================
 # LSL Stream
 # =========================
@@ -96,10 +102,6 @@ def get_numeric_response(win, prompt_text):
 def draw_fixation(win, size=0.05, color='black'):
     return visual.TextStim(win, text='+', height=size, color=color, bold=True, units='height')
 
-def send_marker_on_flip(win, value):
-    # Schedule LSL push_sample on the next screen flip
-    win.callOnFlip(outlet.push_sample, [value])
-
 # =========================
 # Main
 # =========================
@@ -133,62 +135,44 @@ def main():
     seq = ([MARK_ODDBALL] * n_oddballs) + ([MARK_STANDARD] * n_standards)
     random.shuffle(seq)
 
-    # Run
-    trials_since_prompt = 0
-    odd_count_since_prompt = 0
-    kb = keyboard.Keyboard()
-    kb.clearEvents()
-
-    for idx, code in enumerate(seq, start=1):
-        # Fixation (pre-trial)
-        fixation.draw()
-        win.flip()
-        core.wait(PRETRIAL_TIME)
-
-        # Choose tone
-        is_odd = (code == MARK_ODDBALL)
-        tone = tone_oddball if is_odd else tone_standard
+    # Static background behind prompt
+    bg_rect = visual.Rect(win, fillColor=bg_color, lineColor=None, width=2, height=2, units='height')
 
-        # Send marker and start tone precisely on flip
-        send_marker_on_flip(win, code)
-        win.callOnFlip(tone.play)  # schedule audio onset with flip
-        fixation.draw()            # keep fixation visible during tone
-        win.flip()
-
-        # Tone duration (audio plays for STIM_AUDIO_TIME)
-        core.wait(STIM_AUDIO_TIME)
-        tone.stop()  # ensure it stops even if backend ignores secs
-
-        # Randomize total trial length (keep total within [min, max])
+    # Whole schedule in frames: fixation, tone (marker and tone onset on the same flip, fixation stays
+    # visible), then the rest of a random-length trial, stopping the tone even if the backend ignores secs
+    engine = StimulusEngine(win, outlet)
+    schedule = []
+    for code in seq:
+        tone = tone_oddball if code == MARK_ODDBALL else tone_standard
         chosen_total = random.uniform(TRIAL_LEN_MIN, TRIAL_LEN_MAX)
         remaining = max(0.0, chosen_total - PRETRIAL_TIME - STIM_AUDIO_TIME)
-        fixation.draw()
-        win.flip()
-        core.wait(remaining)
+        schedule.append([
+            Event([fixation], engine.frames(PRETRIAL_TIME)),
+            Event([fixation], engine.frames(STIM_AUDIO_TIME), marker=code, on_flip=[tone.play]),
+            Event([fixation], engine.frames(remaining), on_flip=[tone.stop]),
+        ])
 
-        # Update counters
-        trials_since_prompt += 1
-        if is_odd:
-            odd_count_since_prompt += 1
+    # Run
+    kb = keyboard.Keyboard()
+    kb.clearEvents()
 
+    def between_trials(trial_index):
         # Blocked numeric prompt
-        if trials_since_prompt == LEN_BLOCK:
+        if (trial_index + 1) % LEN_BLOCK == 0:
             prompt_text = (
                 "Type how many HIGH (oddball) tones you heard\n"
                 "since the last prompt, then press Enter."
             )
-            # Static background behind prompt
-            bg_rect = visual.Rect(win, fillColor=bg_color, lineColor=None, width=2, height=2, units='height')
             bg_rect.draw()
             win.flip()
             _ = get_numeric_response(win, prompt_text)
-            trials_since_prompt = 0
-            odd_count_since_prompt = 0
 
         # Allow emergency quit
         events = kb.getKeys(waitRelease=False)
-        if any(k.name == 'escape' for k in events):
-            break
+        return not any(k.name == 'escape' for k in events)
+
+    engine.run(schedule, between_trials)
+    engine.save(LOG_DIR, 'aep_oddball')
 
     # End screen
     end_text = write_text(win, 'Task complete!\n\nPress Enter or Esc to exit.', pos=(0, 0), height=0.06)
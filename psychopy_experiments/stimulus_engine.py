@@ -0,0 +1,127 @@
+# Frame-locked stimulus presentation shared by the PsychoPy experiments
+# - Every stimulus and the whole trial schedule are built before the first trial
+# - Durations are counted in screen refreshes instead of core.wait() sleeps
+# - Every flip and every LSL marker is logged, markers are time stamped with the flip they belong to
+import os
+import time
+
+import numpy as np
+from psychopy import core, logging
+from pylsl import local_clock
+
+FLIP_DTYPE = np.dtype([('trial', 'i4'), ('event', 'i2'), ('frame', 'i4'), ('flip_time', 'f8')])
+MARKER_DTYPE = np.dtype([('trial', 'i4'), ('marker', 'i4'), ('flip_time', 'f8'), ('push_time', 'f8')])
+
+
+class Event:
+    """
+    One screen state of a trial: `stims` are drawn on each of `n_frames` refreshes. On the first of them
+    `marker` is pushed to LSL and the `on_flip` functions (e.g. tone.play) are called right after the flip.
+    An event with a marker or on_flip functions lasts at least one refresh, even when its duration rounds to none.
+    """
+
+    def __init__(self, stims=(), n_frames=1, marker=None, on_flip=()):
+        self.stims = list(stims)
+        self.n_frames = n_frames
+        self.marker = marker
+        self.on_flip = list(on_flip)
+
+
+def timing_report(flips, markers, frame_rate):
+    """
+    Summary of a run from its flip and marker logs (structured arrays as written by StimulusEngine.save):
+    frame intervals, dropped frames (within trials, the pauses between trials don't count) and the latency
+    between each marker's flip and its push to LSL.
+    """
+    frame_duration = 1.0 / frame_rate
+    same_trial = flips['trial'][1:] == flips['trial'][:-1]
+    intervals = np.diff(flips['flip_time'])[same_trial]
+    late = intervals > 1.5 * frame_duration
+    latency = markers['push_time'] - markers['flip_time']
+    return {
+        "frame_rate": frame_rate,
+        "n_flips": len(flips),
+        "mean_frame_interval": float(intervals.mean()) if len(intervals) else float('nan'),
+        "sd_frame_interval": float(intervals.std()) if len(intervals) else float('nan'),
+        "late_flips": int(late.sum()),
+        "dropped_frames": int(np.sum(np.round(intervals[late] / frame_duration) - 1)),
+        "n_markers": len(markers),
+        "mean_marker_latency": float(latency.mean()) if len(latency) else float('nan'),
+        "max_marker_latency": float(latency.max()) if len(latency) else float('nan'),
+    }
+
+
+class StimulusEngine:
+    """
+    Runs a schedule (a list of trials, each a list of Events) one refresh at a time.
+
+    Flip times come from PsychoPy's clock and are converted to the LSL clock, so with stamp_markers_at_flip the
+    marker time stamps are the flips themselves rather than the moment the push happened to run.
+    """
+
+    def __init__(self, win, outlet, frame_rate=None, stamp_markers_at_flip=True):
+        self.win = win
+        self.outlet = outlet
+        if frame_rate is None:
+            frame_rate = win.getActualFrameRate(nIdentical=20, nMaxFrames=240) or 60.0
+            logging.info(f"Measured frame rate: {frame_rate:.2f} Hz")
+        self.frame_rate = frame_rate
+        self.stamp_markers_at_flip = stamp_markers_at_flip
+        self._flips = []
+        self._markers = []
+        # Offset from PsychoPy's clock to LSL's, both are monotonic
+        self._clock_offset = local_clock() - core.getTime()
+
+    def frames(self, seconds):
+        # Number of refreshes closest to a duration
+        return int(round(seconds * self.frame_rate))
+
+    def run_event(self, event, trial=-1, event_index=0):
+        n_frames = event.n_frames
+        if event.marker is not None or event.on_flip:
+            # Markers and on_flip calls happen on the first refresh, skipping it would silently lose them
+            n_frames = max(1, n_frames)
+        for frame in range(n_frames):
+            for stim in event.stims:
+                stim.draw()
+            if frame == 0:
+                for function in event.on_flip:
+                    self.win.callOnFlip(function)
+            flip_time = self.win.flip() + self._clock_offset
+            self._flips.append((trial, event_index, frame, flip_time))
+            if frame == 0 and event.marker is not None:
+                push_time = local_clock()
+                self.outlet.push_sample([event.marker], flip_time if self.stamp_markers_at_flip else push_time)
+                self._markers.append((trial, event.marker, flip_time, push_time))
+
+    def run(self, schedule, between_trials=None):
+        """
+        Presents every trial of `schedule`. `between_trials(trial_index)` is called after each trial (prompts,
+        key checks); returning False stops the run. Returns the timing report.
+        """
+        for trial, events in enumerate(schedule):
+            for event_index, event in enumerate(events):
+                self.run_event(event, trial, event_index)
+            if between_trials is not None and between_trials(trial) is False:
+                break
+        report = self.report()
+        logging.info(f"Timing: {report}")
+        return report
+
+    @property
+    def flips(self):
+        return np.array(self._flips, dtype=FLIP_DTYPE)
+
+    @property
+    def markers(self):
+        return np.array(self._markers, dtype=MARKER_DTYPE)
+
+    def report(self):
+        return timing_report(self.flips, self.markers, self.frame_rate)
+
+    def save(self, log_dir, name):
+        # Compressed .npz with the flip and marker logs, named after the experiment and the start time
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(log_dir, f"{name}_{time.strftime('%Y%m%d-%H%M%S')}.npz")
+        np.savez_compressed(path, flips=self.flips, markers=self.markers, frame_rate=self.frame_rate)
+        return path
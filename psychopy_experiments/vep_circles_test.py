@@ -6,6 +6,8 @@ from pylsl import StreamInfo, StreamOutlet
 import random
 import os
 
+from stimulus_engine import Event, StimulusEngine
+
 # Config
 TITLE = "Visual Evoked Potentials"
 PROBABILITY_ODD = 0.2
@@ -26,6 +28,9 @@ circle_radius_px = 100  # radius of circle (in pix when units="pix")
 MARK_STANDARD = 1
 MARK_ODDBALL = 2
 
+# Flip and marker timing logs
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timing_logs')
+
 # Create LSL Stream
 info = StreamInfo(name='PsychopyMarkerStream', type='Markers',
                   channel_count=1, channel_format='int32',
@@ -118,10 +123,6 @@ def get_numeric_response(win, prompt_text):
                 win.close()
                 core.quit()
 
-def send_marker(win, value):
-    """Send a marker value via LSL."""
-    win.callOnFlip(outlet.push_sample, [value])
-
 # Main flow
 def main():
     # Window in height units for easy scaling; grey background
@@ -138,49 +139,37 @@ def main():
     oddball_circle = visual.Circle(win, radius=circle_radius_px,
                                    fillColor=[1.0, -1.0, -1.0],  # red
                                    lineColor=[1.0, -1.0, -1.0])
+    # Static background behind the block prompts
+    bg = visual.Rect(win, fillColor=[0.5, 0.5, 0.5], lineColor=None)
     # Build an exact-length sequence with the desired oddball proportion
     n_oddballs = int(round(NUM_TRIALS * PROBABILITY_ODD))
     n_standards = NUM_TRIALS - n_oddballs
     circles = ([MARK_ODDBALL] * n_oddballs) + ([MARK_STANDARD] * n_standards)
     random.shuffle(circles)
 
-    counter = 0
-    quit_keys = ['escape']
-
-    for i, circle in enumerate(circles, start=1):
+    # Whole schedule in frames: fixation, stimulus (marker on its first flip), then the rest of a random-length trial
+    engine = StimulusEngine(win, outlet)
+    schedule = []
+    for circle in circles:
         stim = oddball_circle if circle == MARK_ODDBALL else standard_circle
-
-        # Pre-trial fixation
-        cross.draw()
-        win.flip()
-        core.wait(PRETRIAL_TIME)
-
-        # Stimulus
-        send_marker(win, MARK_ODDBALL if circle == MARK_ODDBALL else MARK_STANDARD)
-        cross.draw()
-        stim.draw()
-        win.flip()
-        core.wait(STIM_DISPLAY_TIME)
-
-        # Randomize total trial length, keep ITI so total = chosen target
         total_trial_len = random.uniform(TRIAL_LEN_MIN, TRIAL_LEN_MAX)
         remaining_time = max(0.0, total_trial_len - PRETRIAL_TIME - STIM_DISPLAY_TIME)
-        cross.draw()
-        win.flip()
-        core.wait(remaining_time)
-
-        counter += 1
+        schedule.append([
+            Event([cross], engine.frames(PRETRIAL_TIME)),
+            Event([cross, stim], engine.frames(STIM_DISPLAY_TIME), marker=circle),
+            Event([cross], engine.frames(remaining_time)),
+        ])
 
+    def between_trials(trial_index):
         # Blocked numeric prompt
-        if counter == LEN_BLOCK:
-            # Temporarily hide crosshair during prompt
+        if (trial_index + 1) % LEN_BLOCK == 0:
             instructions2 = 'Type the number of red circles\nyou saw since the last time you were prompted,\nand press the enter key.'
-            # Draw static background
-            bg = visual.Rect(win, fillColor=[0.5, 0.5, 0.5], lineColor=None)
             bg.draw()
             win.flip()
             _ = get_numeric_response(win, instructions2)
-            counter = 0  # reset after prompt
+
+    engine.run(schedule, between_trials)
+    engine.save(LOG_DIR, 'vep_circles')
 
 
     # Cleanup
@@ -3,13 +3,17 @@ from psychopy import visual, core, event, logging
 from psychopy.visual import Window
 from pylsl import StreamInfo, StreamOutlet
 
+import os
 import random
 
+from stimulus_engine import Event, StimulusEngine
+
 # Configurable parameters
 total_trials = 400  # Total number of trials
 total_trial_len = 1  # Length of each trial (in seconds)
 stimulus_time = 0.2  # Duration to show the stimulus (in seconds)
 prestimulus_time = 0.2  # Duration of prestimulus (in seconds)
+log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timing_logs')  # Flip and marker timing logs
 
 info = StreamInfo(name='PsychopyMarkerStream', type='Markers', channel_count=1,
                   channel_format='int32', source_id='uniqueid12345')
@@ -37,25 +41,24 @@ event.waitKeys(keyList=["return"])  # Wait for any key press
 # Create a white square stimulus
 stimulus = visual.Rect(win, width=200, height=200, fillColor="white", lineColor="white")
 
-# Start the experiment
-for trial in range(total_trials):
-    logging.info(f"Trial {trial + 1} of {total_trials}")
+# Every trial in frames: prestimulus (blank black screen), stimulus (white square, marker on its first flip),
+# then a blank screen for the rest of the trial
+engine = StimulusEngine(win, outlet)
+trial_events = [
+    Event([], engine.frames(prestimulus_time)),
+    Event([stimulus], engine.frames(stimulus_time), marker=1),
+    Event([], engine.frames(total_trial_len - prestimulus_time - stimulus_time)),
+]
+schedule = [trial_events] * total_trials
 
-    # Display the prestimulus (blank black screen)
-    win.flip()
-    core.wait(prestimulus_time)
 
+def log_trial(trial):
+    logging.info(f"Trial {trial + 1} of {total_trials}")
 
-    # Show stimulus (white square)
-    stimulus.draw()
-    # Send marker for stimulus
-    win.callOnFlip(outlet.push_sample, [1])
-    win.flip()
-    core.wait(stimulus_time)
 
-    # End of trial, intertrial interval
-    win.flip()  # Blank screen
-    core.wait(total_trial_len - prestimulus_time - stimulus_time)  # Remaining time in trial
+# Start the experiment
+engine.run(schedule, log_trial)
+engine.save(log_dir, 'vep_light')
 
 # End the experiment and close the window
 win.close()
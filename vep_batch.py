@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from ExperimentDataVEP import ExperimentDataVEP
+from GrandAverage import GrandAverage
+from SessionCache import SessionCache
+
+# Options a manifest entry may set, with the ExperimentDataVEP defaults used when it doesn't
+SESSION_DEFAULTS = dict(min_frequency=0.5, max_frequency=30, tmin=-0.2, tmax=0.5, bad_ch=None)
+
+
+def read_manifest(manifest_path):
+    """
+    Reads a JSON manifest, either a list of sessions or {"defaults": {...}, "sessions": [...]}.
+    Each session is a path string or a dict with "xdf_path" and optional "name", "subject" (sessions of the same
+    subject are averaged together before the grand average, defaults to the name) and SESSION_DEFAULTS keys.
+    Relative paths are resolved against the manifest's directory. Names must be unique, outputs are named after them.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"sessions": manifest}
+    defaults = {**SESSION_DEFAULTS, **manifest.get("defaults", {})}
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    sessions = []
+    for entry in manifest["sessions"]:
+        if isinstance(entry, str):
+            entry = {"xdf_path": entry}
+        session = {**defaults, **entry}
+        session["xdf_path"] = os.path.join(base_dir, session["xdf_path"])
+        session.setdefault("name", os.path.splitext(os.path.basename(session["xdf_path"]))[0])
+        sessions.append(session)
+    names = [session["name"] for session in sessions]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f'Sessions with the same name would overwrite each other\'s outputs: {duplicates}, '
+                         'give them distinct "name"s in the manifest')
+    return sessions
+
+
+def load_session(session, cache_dir=None):
+    # ExperimentDataVEP of a manifest session, with a parsed-session cache shared between runs when cache_dir is set
+    options = {key: session[key] for key in SESSION_DEFAULTS}
+    cache = SessionCache(cache_dir) if cache_dir is not None else None
+    return ExperimentDataVEP(session["xdf_path"], cache=cache, **options)
+
+
+def run_session(work, session, *args):
+    # Runs in a worker process; never raises so one bad session can't take down the pool
+    started = time.perf_counter()
+    result = {"name": session["name"], "xdf_path": session["xdf_path"]}
+    try:
+        result.update(status="ok", **work(session, *args))
+    except Exception as e:
+        result.update(status="failed", error=repr(e), traceback=traceback.format_exc())
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def run_sessions(work, sessions, *args, max_workers=None):
+    """
+    Runs work(session, *args) for every session in a process pool and yields the sessions' results in completion
+    order, printing progress and a final summary. work returns the fields added to a result, which also holds the
+    session's "name", "xdf_path", "status" ("ok" or "failed", with "error" and "traceback") and "seconds".
+    """
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run_session, work, session, *args): session for session in sessions}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                # A worker was killed (out of memory, crash in native code): this and the unfinished sessions fail
+                session = futures[future]
+                result = {"name": session["name"], "xdf_path": session["xdf_path"], "status": "failed",
+                          "error": repr(e), "seconds": 0.0}
+            failed += result["status"] != "ok"
+            detail = f'{result["n_epochs"]} epochs' if result["status"] == "ok" else result["error"]
+            print(f'[{done}/{len(sessions)}] {result["name"]}: {result["status"]} in {result["seconds"]:.1f} s '
+                  f'({detail})', flush=True)
+            yield result
+    print(f'Finished {len(sessions)} sessions in {time.perf_counter() - started:.1f} s, {failed} failed')
+
+
+def process_session(session, output_dir, cache_dir=None):
+    # Saves a session's epochs and evokeds, returns their paths and its GrandAverage accumulator
+    import mne
+    data = load_session(session, cache_dir)
+    epochs_path = os.path.join(output_dir, f'{session["name"]}-epo.fif')
+    evoked_path = os.path.join(output_dir, f'{session["name"]}-ave.fif')
+    data._epochs.save(epochs_path, overwrite=True)
+    evokeds = [data._epochs[condition].average() for condition in data._epochs.event_id]
+    mne.write_evokeds(evoked_path, evokeds, overwrite=True)
+    # Sent back to the parent process, which merges the accumulators of all workers
+    grand_average = GrandAverage()
+    grand_average.add_epochs(data._epochs, session.get("subject", session["name"]))
+    return dict(n_epochs=len(data._epochs), epochs=epochs_path, evokeds=evoked_path, grand_average=grand_average)
+
+
+def run_batch(sessions, output_dir, max_workers=None, cache_dir=None):
+    import mne
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    grand_average = GrandAverage()
+    for result in run_sessions(process_session, sessions, output_dir, cache_dir, max_workers=max_workers):
+        results.append(result)
+        if result["status"] == "ok":
+            try:
+                grand_average.merge(result.pop("grand_average"))
+            except ValueError as e:
+                print(f'{result["name"]} left out of the grand average: {e}', flush=True)
+    if grand_average.trials:
+        mne.write_evokeds(os.path.join(output_dir, 'grand_average-ave.fif'), grand_average.to_evokeds(),
+                          overwrite=True)
+    with open(os.path.join(output_dir, 'batch_summary.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process many VEP sessions in parallel.')
+    parser.add_argument('manifest', help='JSON manifest of sessions')
+    parser.add_argument('-o', '--output-dir', default='vep_output')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--cache-dir', default=None, help='Share a parsed-session cache between runs')
+    args = parser.parse_args()
+    try:
+        sessions = read_manifest(args.manifest)
+    except ValueError as e:
+        parser.error(str(e))
+    results = run_batch(sessions, args.output_dir, args.jobs, args.cache_dir)
+    sys.exit(1 if any(r["status"] != "ok" for r in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
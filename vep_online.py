@@ -0,0 +1,49 @@
+import argparse
+
+import numpy as np
+
+from OnlineVEP import OnlineVEP
+from XdfReplay import XdfReplay
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Live standard/oddball VEP averages from LSL streams.')
+    parser.add_argument('--replay', metavar='XDF', help='Replay a recorded session through local outlets')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed factor')
+    parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds')
+    parser.add_argument('--eeg-stream', default=None, help='Name of the EEG stream (default: first regular stream)')
+    parser.add_argument('--tmin', type=float, default=-0.2)
+    parser.add_argument('--tmax', type=float, default=0.5)
+    args = parser.parse_args()
+
+    # The replay outlets exist from here on, but nothing is pushed until the inlets are connected
+    replay = XdfReplay(args.replay, speed=args.speed) if args.replay else None
+
+    def report(condition, stats):
+        peak = np.max(np.abs(stats.mean)) * 1e6
+        print(f'{condition:>8}: {stats.count:4d} trials, peak |mean| {peak:7.2f} uV')
+
+    online = OnlineVEP(eeg_stream_name=args.eeg_stream, tmin=args.tmin, tmax=args.tmax, on_update=report)
+    online.connect()
+    if replay is not None:
+        replay.start()
+    try:
+        if replay is not None and args.duration is None:
+            while not replay.finished:
+                online.run(duration=1.0)
+            online.run(duration=1.0)  # Drain what is still queued in the inlets
+        else:
+            online.run(duration=args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if replay is not None:
+            replay.stop()
+    if online.update_latencies:
+        print(f'{sum(stats.count for stats in online.stats.values())} trials averaged, latency from the end of '
+              f'their epoch window to the updated average: median {1e3 * np.median(online.update_latencies):.3f} ms, '
+              f'max {1e3 * np.max(online.update_latencies):.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
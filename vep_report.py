@@ -0,0 +1,128 @@
+import argparse
+import base64
+import html
+import io
+import json
+import os
+import sys
+
+import matplotlib
+
+matplotlib.use('Agg')  # Headless rendering, before anything imports pyplot
+
+import mne  # noqa: E402
+from matplotlib import pyplot as plt  # noqa: E402
+
+from vep_batch import load_session, read_manifest, run_sessions  # noqa: E402
+
+FORMATS = ('html', 'png')
+
+
+def _evoked_figures(data):
+    for condition in data._epochs.event_id:
+        evoked = data._epochs[condition].average()
+        yield f'evoked_{condition}', f'Evoked response and GFP: {condition}', evoked.plot(
+            gfp=True, spatial_colors=True, show=False)
+        yield f'topomap_{condition}', f'Topomaps at the GFP peaks: {condition}', evoked.plot_topomap(
+            times='peaks', show=False)
+
+
+def session_figures(data, picks=None, duration=10, n_epochs=10):
+    """
+    Yields (name, title, figure) for every figure of a session's report, one at a time so each can be saved and
+    closed before the next is drawn: sensors, raw traces, epochs, condition comparison, evoked responses with
+    GFP and topomaps per condition, and the drop log.
+    """
+    yield 'sensors', 'Sensors', data.plot_sensors(show=False)
+    yield 'raw', f'Filtered recording, first {duration} s', data.plot_all_channels(duration=duration, show=False)
+    yield 'epochs', 'Epochs', data.plot_epochs(n_epochs=n_epochs, show=False)
+    yield 'compare_conditions', 'Conditions compared', data.plot_compare_conditions(picks=picks)
+    yield from _evoked_figures(data)
+    yield 'drop_log', 'Drop log', data._epochs.plot_drop_log(show=False)
+
+
+def _png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def _summary(data):
+    # Rows for the report header
+    epochs = data._epochs
+    rows = {"File": data.metadata["original_filename"], "Sample rate": f'{data.sample_rate:g} Hz',
+            "Passband": f'{data.min_frequency} - {data.max_frequency} Hz',
+            "Epoch window": f'{data.tmin} - {data.tmax} s', "Bad channels": ', '.join(data._bads) or 'none'}
+    for condition in epochs.event_id:
+        rows[f'Epochs: {condition}'] = len(epochs[condition])
+    return rows
+
+
+def write_html(path, name, summary, figures):
+    # A single self-contained file, the PNGs are embedded as data URIs
+    rows = ''.join(f'<tr><th>{html.escape(str(key))}</th><td>{html.escape(str(value))}</td></tr>'
+                   for key, value in summary.items())
+    sections = ''.join(f'<h2>{html.escape(title)}</h2><img src="data:image/png;base64,'
+                       f'{base64.b64encode(png).decode("ascii")}" alt="{html.escape(title)}">'
+                       for title, png in figures)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(name)}</title>'
+                '<style>body{font-family:sans-serif;margin:2em}img{max-width:100%}th{text-align:left;'
+                f'padding-right:1em}}</style></head><body><h1>{html.escape(name)}</h1><table>{rows}</table>'
+                f'{sections}</body></html>')
+
+
+def render_session(session, output_dir, formats=FORMATS, cache_dir=None, picks=None):
+    # Saves a session's report figures, returns the files written
+    data = load_session(session, cache_dir)
+    session_dir = os.path.join(output_dir, session["name"])
+    os.makedirs(session_dir, exist_ok=True)
+    rendered = []
+    files = []
+    for name, title, fig in session_figures(data, picks=picks):
+        try:
+            png = _png(fig)
+        finally:
+            plt.close(fig)
+        if 'png' in formats:
+            files.append(os.path.join(session_dir, f'{name}.png'))
+            with open(files[-1], 'wb') as f:
+                f.write(png)
+        if 'html' in formats:
+            rendered.append((title, png))
+    if 'html' in formats:
+        files.append(os.path.join(session_dir, 'report.html'))
+        write_html(files[-1], session["name"], _summary(data), rendered)
+    return dict(n_epochs=len(data._epochs), files=files)
+
+
+def run_reports(sessions, output_dir, formats=FORMATS, max_workers=None, cache_dir=None, picks=None):
+    os.makedirs(output_dir, exist_ok=True)
+    results = list(run_sessions(render_session, sessions, output_dir, formats, cache_dir, picks,
+                                max_workers=max_workers))
+    with open(os.path.join(output_dir, 'report_summary.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render per-session VEP report figures without a display.')
+    parser.add_argument('manifest', help='JSON manifest of sessions, as for vep_batch.py')
+    parser.add_argument('-o', '--output-dir', default='vep_reports')
+    parser.add_argument('-f', '--format', nargs='+', choices=FORMATS, default=['html'],
+                        help='One self-contained report.html and/or a PNG per figure (default: html)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--cache-dir', default=None, help='Share a parsed-session cache between runs')
+    parser.add_argument('--picks', nargs='+', default=None, help='Channels for the condition comparison')
+    args = parser.parse_args()
+    try:
+        sessions = read_manifest(args.manifest)
+    except ValueError as e:
+        parser.error(str(e))
+    mne.set_log_level('WARNING')
+    results = run_reports(sessions, args.output_dir, tuple(args.format), args.jobs, args.cache_dir, args.picks)
+    sys.exit(1 if any(r["status"] != "ok" for r in results) else 0)
+
+
+if __name__ == "__main__":
+    main()